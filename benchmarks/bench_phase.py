@@ -0,0 +1,84 @@
+'''Per-phase construction cost and memory of _Phase.
+
+Compares the current slotted _Phase (integer time math, memoized) with the
+earlier dict-based _Phase that computed time with np.ceil, kept here as
+_DictPhase. Results are printed as JSON. Run from the repository root:
+
+    python benchmarks/bench_phase.py --phases 200000
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import firing_curve  # noqa: E402
+
+
+class _DictPhase:
+    '''_Phase as it was before it got __slots__ and integer time math'''
+    def __init__(self, velocity=1, endTemp=0, holdingTime=0, index=0, startTemp=None):
+        self._velocity = int(velocity)
+        self._endTemp = int(endTemp)
+        self._holdingTime = int(holdingTime)
+        self._index = index
+        self._nextPhase = None
+        self._prevPhase = None
+        self._startTemp = startTemp
+        self._time = self._calculateTime()
+        self._color = None
+
+    def _calculateTime(self):
+        if self._velocity == 0:
+            return self._holdingTime
+        return np.ceil(abs((self._endTemp - self._startTemp) / (self._velocity/60)) + self._holdingTime).astype(int)
+
+
+def phase_arguments(count, distinct):
+    '''Arguments for count phases drawn from distinct different phases, like a catalog repeating itself'''
+    rng = random.Random(1)
+    pool = [(rng.choice([-450, -45, -20, 300, 999]), rng.randrange(400, 850, 10), rng.choice([0, 10]),
+             0, rng.randrange(10, 31)) for _ in range(distinct)]
+    return [pool[rng.randrange(distinct)] for _ in range(count)]
+
+
+def construction(cls, arguments):
+    start = time.perf_counter()
+    for args in arguments:
+        cls(*args)
+    return (time.perf_counter() - start) / len(arguments)
+
+
+def bytes_per_phase(cls, arguments):
+    tracemalloc.start()
+    phases = [cls(*args) for args in arguments]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The list holding them costs one pointer per phase, which is not the phase's
+    return size / len(phases) - 8
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--phases", type=int, default=200000)
+    parser.add_argument("--distinct", type=int, default=1000, help="different phases among them")
+    args = parser.parse_args(argv)
+
+    arguments = phase_arguments(args.phases, args.distinct)
+    results = {}
+    for name, cls in (("dict_np_ceil", _DictPhase), ("slots_int_memo", firing_curve._Phase)):
+        firing_curve._phaseTime.cache_clear()
+        results[name] = {"ns_per_phase": round(1e9 * construction(cls, arguments), 1),
+                         "bytes_per_phase": round(bytes_per_phase(cls, arguments[:50000]), 1)}
+    results["memo_cache"] = firing_curve._phaseTime.cache_info()._asdict()
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+'''Time per image of the curve previews.
+
+Compares the pyplot plotting_of_curve as it was before CurveRenderer, kept here
+as legacy_plot, with CurveRenderer autoscaling each curve and with fixed axes
+limits, and renders a catalog sample with render_curves. Results are printed as
+JSON. Run from the repository root:
+
+    python benchmarks/bench_render.py --images 50
+'''
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import firing_curve  # noqa: E402
+import curve_renderer  # noqa: E402
+
+
+def legacy_plot(curve):
+    '''plotting_of_curve as it was before CurveRenderer: pyplot, one plt.plot per phase'''
+    total_time = 0
+    current_temp = curve._roomTemp
+
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(10, 6))
+
+    # Create a colormap
+    cmap = plt.get_cmap('tab20')  # A colormap with many distinct colors
+
+    times = [0]
+    temperatures = [current_temp]
+
+    for idx, phase in enumerate(curve):
+        # Assign a color if it's not already set
+        if phase._color is None:
+            phase._color = cmap(idx % 20)  # Get a color from the colormap
+
+        # Calculate time increment for the phase
+        phase_time = phase._time
+        middle_time = None
+        if phase._holdingTime != 0:
+            phase_holdingTime = phase._holdingTime
+            middle_time = total_time + phase_time - phase_holdingTime
+        start_time = total_time
+        end_time = total_time + phase_time
+        total_time = end_time
+
+        # Time points for this phase
+        if middle_time:
+            time_points = [start_time, middle_time, end_time]
+        else:
+            time_points = [start_time, end_time]
+
+        # Temperature points for this phase
+        if phase._velocity == 0:
+            # Holding phase
+            temp_points = [current_temp, current_temp]
+        else:
+            if middle_time:
+                temp_points = [current_temp, phase._endTemp, phase._endTemp]
+            else:
+                temp_points = [current_temp, phase._endTemp]
+
+        # Plot this phase
+        plt.plot(time_points, temp_points, marker='o', color=phase._color, label=f'Fas {idx+1}')
+
+        # Update current temperature
+        current_temp = phase._endTemp
+
+        # Append to lists for potential use later
+        times.append(end_time)
+        temperatures.append(current_temp)
+
+    plt.title('Brännkurva')
+    plt.xlabel('Tid (minuter)')
+    plt.ylabel('Temperatur (°C)')
+    plt.grid(True)
+    plt.legend(title='Faser', bbox_to_anchor=(1.05, 1), loc='upper left')  # Place legend outside the plot
+    plt.tight_layout()
+    return fig
+
+
+def legacy_render(curve, out):
+    import matplotlib.pyplot as plt
+    fig = legacy_plot(curve)
+    fig.savefig(out, format="png")
+    plt.close(fig)
+
+
+def per_image(render, curves):
+    start = time.perf_counter()
+    for curve in curves:
+        render(curve, io.BytesIO())
+    return round(1000 * (time.perf_counter() - start) / len(curves), 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    handler = firing_curve.GlassTypeHandler("tables.json")
+    orders = list(handler.catalog_orders())[::97][:args.images]
+    batch = handler.batch_curves(*(list(column) for column in zip(*orders)))
+    curves = list(batch.curves())
+    limits = (int(batch.totalTimes.max()), int(batch.endTemps.max()))
+
+    auto = curve_renderer.CurveRenderer()
+    fixed = curve_renderer.CurveRenderer(limits=limits)
+    results = {"legacy_pyplot_ms_per_image": per_image(legacy_render, curves),
+               "renderer_ms_per_image": per_image(lambda c, out: auto.render(c, out, "png"), curves),
+               "renderer_fixed_limits_ms_per_image": per_image(lambda c, out: fixed.render(c, out, "png"), curves)}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, f"{i}.png") for i in range(len(batch))]
+        stats = curve_renderer.render_curves([batch], paths, args.workers, limits=limits)
+    results["render_curves"] = stats
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+'''Cold start benchmark for firing_curve.py.
+
+Each case runs in a fresh interpreter and times importing the module and
+building a curve, with and without the plotting dependencies. Results are
+printed as JSON. Run from the repository root:
+
+    python benchmarks/bench_startup.py --repeat 10
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    # The firingCurve/_Phase path our workers use, must not load matplotlib
+    "core": "import firing_curve\n"
+            "c = firing_curve.firingCurve(20)\n"
+            "c.newPhase(300, 540)\n"
+            "c.newPhase(-20, 20)\n",
+    # Same, plus what the first plot costs
+    "core+plotting": "import firing_curve\n"
+                     "c = firing_curve.firingCurve(20)\n"
+                     "c.newPhase(300, 540)\n"
+                     "c.newPhase(-20, 20)\n"
+                     "import matplotlib.pyplot\n",
+}
+
+TIMER = '''import time, sys
+start = time.perf_counter()
+exec(compile({code!r}, "<case>", "exec"))
+print(time.perf_counter() - start, "matplotlib" in sys.modules)
+'''
+
+
+def run_case(code, repeat):
+    '''Runs a case in repeat fresh interpreters, returns seconds per run and whether matplotlib got loaded'''
+    times, loaded = [], set()
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", TIMER.format(code=code)], cwd=REPO_DIR,
+                             env={**os.environ, "MPLBACKEND": "Agg"},
+                             capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(out[0]))
+        loaded.add(out[1] == "True")
+    return times, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, code in CASES.items():
+        times, loaded = run_case(code, args.repeat)
+        results[name] = {"median_ms": round(1000*statistics.median(times), 2),
+                         "min_ms": round(1000*min(times), 2),
+                         "matplotlib_loaded": loaded == {True}}
+    print(json.dumps(results, indent=2))
+    return 0 if not results["core"]["matplotlib_loaded"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
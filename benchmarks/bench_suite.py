@@ -0,0 +1,171 @@
+'''Benchmark suite for the firingCurve mutation and GlassTypeHandler generation hot paths.
+
+Builds synthetic curves of 10 to 100k phases in both storage modes, runs
+random middle inserts, removals, lookups, edits and health checks on them,
+and generates curves end to end from tables.json. Reports ops/s, latency
+percentiles and peak memory as JSON, and compares ops/s with a stored
+baseline so slowdowns fail the run. Run from the repository root:
+
+    python benchmarks/bench_suite.py                   # compare with benchmarks/baseline.json
+    python benchmarks/bench_suite.py --save-baseline   # record a new baseline on this machine
+'''
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import firing_curve  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SIZES = (10, 100, 1000, 10000, 100000)
+STORAGES = {"linked": firing_curve.firingCurve, "compact": firing_curve.compactFiringCurve}
+
+
+def random_phase(rng):
+    return rng.choice([-450, -45, -20, 0, 300, 999]), rng.randrange(400, 850, 10), rng.choice([0, 0, 10])
+
+
+def build_curve(storage, n, rng):
+    '''A curve of n random phases, appended with newPhase'''
+    curve = storage(20, capacity=n) if storage is firing_curve.compactFiringCurve else storage(20)
+    for phase in (random_phase(rng) for _ in range(n)):
+        curve.newPhase(*phase)
+    return curve
+
+
+def operations(curve, rng):
+    '''Random operations on the middle of the curve, by name'''
+    def middle():
+        return rng.randrange(1, curve._totalPhases - 1)
+
+    def ten_edits():
+        with curve.transaction():
+            for _ in range(10):
+                curve.changePhaseVelocity(middle(), rng.choice([-45, 300, 999]))
+    return {
+        "newPhase": lambda: curve.newPhase(*random_phase(rng), index=middle()),
+        "removePhase": lambda: curve.removePhase(middle()),
+        "findPhase": lambda: curve.findPhase(middle()),
+        "changePhaseEndTemp": lambda: curve.changePhaseEndTemp(middle(), rng.randrange(400, 850, 10)),
+        "changePhaseVelocity": lambda: curve.changePhaseVelocity(middle(), rng.choice([-45, 300, 999])),
+        "changePhaseHoldingTime": lambda: curve.changePhaseHoldingTime(middle(), rng.randrange(0, 30)),
+        "transaction(10 x changePhaseVelocity)": ten_edits,
+        "_uppdateIndexAndTime": lambda: curve._uppdateIndexAndTime(curve._firstPhase),
+        "_quickHealthy": curve._quickHealthy,
+        "_healthy": curve._healthy,
+    }
+
+
+def measure(operation, count):
+    '''Runs operation count times and returns ops/s and latency percentiles in microseconds'''
+    latencies = np.empty(count)
+    for i in range(count):
+        start = time.perf_counter_ns()
+        operation()
+        latencies[i] = time.perf_counter_ns() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) / 1000
+    return {"ops_per_s": round(1e9 * count / latencies.sum(), 1),
+            "p50_us": round(p50, 2), "p95_us": round(p95, 2), "p99_us": round(p99, 2)}
+
+
+def peak_kib(function):
+    '''Peak traced memory while running function'''
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def bench_mutations(sizes, budget):
+    results = {}
+    for storage_name, storage in STORAGES.items():
+        for n in sizes:
+            rng = random.Random(n)
+            # Fewer operations on big curves, where a linked-list operation walks the whole list
+            count = max(10, min(1000, budget // n))
+            memory = peak_kib(lambda: build_curve(storage, n, random.Random(n)))
+            curve = build_curve(storage, n, rng)
+            for op_name, operation in operations(curve, rng).items():
+                result = measure(operation, count)
+                result["peak_kib"] = memory
+                results[f"{storage_name}/{op_name}/n={n}"] = result
+    return results
+
+
+def bench_generation(orders):
+    orders = list(orders)
+    rng = random.Random(0)
+    sample = [orders[rng.randrange(len(orders))] for _ in range(2000)]
+    results = {}
+    for mode in firing_curve.GlassTypeHandler.VALIDATION_MODES:
+        handler = firing_curve.GlassTypeHandler("tables.json", validation=mode)
+        # Every mode starts from the same cold phase time cache and one warm-up pass,
+        # so the mode timed first does not pay the cache misses for the others
+        firing_curve._phaseTime.cache_clear()
+        for order in sample:
+            handler.curve_from_parameters(*order)
+        single = iter(sample)
+        result = measure(lambda: handler.curve_from_parameters(*next(single)), len(sample))
+        result["peak_kib"] = peak_kib(lambda: handler.curve_from_parameters(*sample[0]))
+        results[f"generation/curve_from_parameters/validation={mode}"] = result
+
+    handler = firing_curve.GlassTypeHandler("tables.json")
+    columns = [list(column) for column in zip(*orders)]
+    result = measure(lambda: handler.batch_curves(*columns), 5)
+    # Count curves, not calls, so the number compares with the single-curve path
+    result["ops_per_s"] = round(result["ops_per_s"] * len(orders), 1)
+    result["peak_kib"] = peak_kib(lambda: handler.batch_curves(*columns))
+    results["generation/batch_curves"] = result
+    return results
+
+
+def compare(results, baseline, tolerance):
+    '''Names of the benchmarks whose ops/s dropped more than tolerance below the baseline'''
+    regressions = []
+    for name, old in baseline.items():
+        new = results.get(name)
+        if new is not None and new["ops_per_s"] < old["ops_per_s"] * (1 - tolerance):
+            regressions.append({"benchmark": name, "baseline_ops_per_s": old["ops_per_s"],
+                                "ops_per_s": new["ops_per_s"]})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--budget", type=int, default=200000, help="operations x phases per benchmark")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed fractional drop in ops/s")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    handler = firing_curve.GlassTypeHandler("tables.json")
+    results = bench_mutations(args.sizes, args.budget)
+    results.update(bench_generation(handler.catalog_orders()))
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+        regressions = []
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+    else:
+        regressions = []
+    print(json.dumps({"results": results, "regressions": regressions}, indent=1))
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the baseline", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from firing_curve import GlassTypeHandler, firingCurve
+
+
+class CurveCache:
+    '''Persistent cache of generated curves in a SQLite file.
+
+    An entry is keyed on a hash of the order parameters and of the table file contents, and
+    stored with the table hash, so editing tables.json invalidates everything computed from
+    the old version. The phases are stored as a packed int64 array. A small in-memory
+    LRU in front of the file serves the hot configurations; their uses are written to the
+    file in batches, so eviction from the file still follows the most recent use.'''
+    TOUCH_BATCH = 256  # Memory hits collected before their use is written to the file
+
+    def __init__(self, handler, path, max_entries = 100000, memory_entries = 1024, check_interval = 1.0):
+        '''check_interval is how many seconds may pass between checks of the table file for changes'''
+        self.handler = handler
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.check_interval = check_interval
+        self._tables_checked_at = -check_interval
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._tables_stat = None
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS curves (key BLOB PRIMARY KEY, tables_hash TEXT, "
+                         "phases BLOB, last_used REAL) WITHOUT ROWID")
+        self._db.execute("CREATE INDEX IF NOT EXISTS curves_last_used ON curves (last_used)")
+        self._check_tables()
+
+    def _check_tables(self):
+        '''Rehashes the table file if it changed on disk, reloads the handler and drops
+        entries computed from older versions. Looks at the file at most every check_interval.'''
+        now = time.monotonic()
+        if now - self._tables_checked_at < self.check_interval:
+            return
+        self._tables_checked_at = now
+        path = self.handler._json_file_path()
+        stat = os.stat(path)
+        stat = (stat.st_mtime_ns, stat.st_size)
+        if stat == self._tables_stat:
+            return
+        with open(path, "rb") as file:
+            self.tables_hash = hashlib.sha256(file.read()).hexdigest()
+        if self._tables_stat is not None:
+            self.handler = GlassTypeHandler(self.handler.json_filepath, self.handler.validation, self.handler.sample_rate)
+        self._tables_stat = stat
+        self._memory.clear()
+        self._touched.clear()
+        self._db.execute("DELETE FROM curves WHERE tables_hash != ?", (self.tables_hash,))
+        (self._entries,) = self._db.execute("SELECT COUNT(*) FROM curves").fetchone()
+
+    def _disk_key(self, params):
+        return hashlib.sha256((self.tables_hash + json.dumps(params)).encode()).digest()
+
+    def phases(self, glass_name, oven_type, radius, layers, minutes, room_temp, firing_type):
+        '''Read-only (phases x 5) array of velocity, start temperature, end temperature,
+        holding time and time for the order, computed and stored on a miss'''
+        with self._lock:
+            self._check_tables()
+            params = (glass_name, oven_type, float(radius), float(layers), int(minutes), int(room_temp), firing_type)
+            entry = self._memory.get(params)
+            if entry is not None:
+                self._memory.move_to_end(params)
+                self.hits += 1
+                self.memory_hits += 1
+                key, phases = entry
+                self._touched[key] = time.time()
+                if len(self._touched) >= self.TOUCH_BATCH:
+                    self._write_touched()
+                return phases
+
+            key = self._disk_key(params)
+            row = self._db.execute("SELECT phases FROM curves WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.hits += 1
+                phases = np.frombuffer(row[0], dtype=np.int64).reshape(-1, 5)
+                self._db.execute("UPDATE curves SET last_used = ? WHERE key = ?", (time.time(), key))
+            else:
+                self.misses += 1
+                curve = self.handler.curve_from_parameters(glass_name, oven_type, radius, layers, minutes, room_temp, firing_type)
+                phases = np.ascontiguousarray(curve._columns().T)
+                phases.flags.writeable = False
+                self._db.execute("INSERT OR REPLACE INTO curves VALUES (?, ?, ?, ?)",
+                                 (key, self.tables_hash, phases.tobytes(), time.time()))
+                self._entries += 1
+                self._evict()
+            self._remember(params, key, phases)
+            return phases
+
+    def curve(self, glass_name, oven_type, radius, layers, minutes, room_temp, firing_type):
+        '''The order's curve as a new firingCurve, built from the cached phases'''
+        phases = self.phases(glass_name, oven_type, radius, layers, minutes, room_temp, firing_type)
+        curve = firingCurve(int(room_temp))
+        with curve.transaction():
+            for velocity, _, endTemp, holdingTime, _ in phases.tolist():
+                curve.newPhase(velocity, endTemp, holdingTime)
+        return curve
+
+    def _remember(self, params, key, phases):
+        self._memory[params] = (key, phases)
+        if len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _write_touched(self):
+        '''Writes the last use of the entries served from memory to the file'''
+        if self._touched:
+            self._db.executemany("UPDATE curves SET last_used = ? WHERE key = ?",
+                                 [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self):
+        '''Deletes the least recently used entries above max_entries'''
+        if self._entries > self.max_entries:
+            self._write_touched()
+            cursor = self._db.execute("DELETE FROM curves WHERE key IN (SELECT key FROM curves ORDER BY last_used LIMIT ?)",
+                                      (self._entries - self.max_entries,))
+            self._entries -= cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "memory_hits": self.memory_hits, "misses": self.misses,
+                    "entries": self._entries, "memory_entries": len(self._memory)}
+
+    def close(self):
+        with self._lock:
+            self._write_touched()
+            self._db.close()
@@ -0,0 +1,188 @@
+import collections
+import concurrent.futures
+import itertools
+import os
+import time
+
+import numpy as np
+
+from firing_curve import _CURVE_HEADER, _CURVE_MAGIC, _breakpoints, _phaseRecords, _readCurve, firingCurveBatch
+
+
+class CurveRenderer:
+    '''Draws firing curves on one reused matplotlib figure, without pyplot.
+
+    All phases are one LineCollection and the breakpoints one scatter, so drawing another
+    curve only replaces their data instead of creating new artists. Without a figure the
+    renderer makes its own on an Agg canvas, which is safe to use outside the main thread.'''
+    def __init__(self, figure = None, figsize = (10, 6), dpi = 100, limits = None, png_compression = 1):
+        '''limits, as (minutes, degrees), fixes the axes to 0-minutes and 0-degrees for every curve.
+        The axes, grid and legend are then drawn once and only the curve is drawn per image.'''
+        from matplotlib import colormaps
+        from matplotlib.collections import LineCollection
+        if figure is None:
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from matplotlib.figure import Figure
+            figure = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(figure)
+        self.figure = figure
+        self.axes = figure.add_subplot()
+        self.axes.set_title('Brännkurva')
+        self.axes.set_xlabel('Tid (minuter)')
+        self.axes.set_ylabel('Temperatur (°C)')
+        self.axes.grid(True)
+        self.palette = colormaps['tab20'](np.arange(20))
+        self._lines = self.axes.add_collection(LineCollection([], linewidths=1.5))
+        self._points = self.axes.scatter([], [], s=36, zorder=3)
+        self._legend = None
+        self._legendPhases = 0
+        self.limits = limits
+        self.png_compression = png_compression
+        self._background = None
+        self._backgroundKey = None
+        if limits is not None:
+            minutes, degrees = limits
+            self.axes.set_xlim(-0.05*minutes, 1.05*minutes)
+            self.axes.set_ylim(-0.05*degrees, 1.05*degrees)
+
+    def colors(self, phases):
+        '''Default RGBA color of each of the first phases'''
+        return self.palette[np.arange(phases) % len(self.palette)]
+
+    def _draw(self, times, temps, colors):
+        points = np.column_stack([times, temps])
+        phaseColors = np.repeat(colors, 2, axis=0)
+        self._lines.set_segments(np.stack([points[:-1], points[1:]], axis=1))
+        self._lines.set_color(phaseColors)
+        self._points.set_offsets(points)
+        self._points.set_color(np.vstack([colors[:1], phaseColors]))
+        if self.limits is None:
+            span = max(times[-1], 1)
+            low, high = min(temps), max(temps)
+            self.axes.set_xlim(-0.05*span, 1.05*span)
+            self.axes.set_ylim(low - 0.05*(high - low) - 1, high + 0.05*(high - low) + 1)
+        self._updateLegend(colors)
+
+    def _updateLegend(self, colors):
+        '''Makes a new legend when the number of phases changes, otherwise only recolors it'''
+        if len(colors) != self._legendPhases:
+            from matplotlib.lines import Line2D
+            handles = [Line2D([], [], marker='o', label=f'Fas {i+1}') for i in range(len(colors))]
+            self._legend = self.axes.legend(handles=handles, title='Faser', bbox_to_anchor=(1.05, 1), loc='upper left')
+            self._legendPhases = len(colors)
+            self.figure.tight_layout()
+        for line, color in zip(self._legend.get_lines(), colors):
+            line.set_color(color)
+
+    def draw(self, curve):
+        '''Draws a firingCurve or compactFiringCurve, in the phases' own colors where they are set'''
+        times, temps = curve.breakpoints()
+        colors = self.colors(curve._totalPhases)
+        for i, phase in enumerate(curve):
+            if phase._color is not None:
+                from matplotlib.colors import to_rgba
+                colors[i] = to_rgba(phase._color)
+        self._draw(times, temps, colors)
+
+    def draw_bytes(self, data):
+        '''Draws a curve serialized with to_bytes, without building it'''
+        roomTemp, records = _readCurve(data)
+        startTemps = np.concatenate([[roomTemp], records["endTemp"][:-1]])
+        times, temps = _breakpoints(roomTemp, records["velocity"], startTemps, records["endTemp"],
+                                    records["holdingTime"], records["time"])
+        self._draw(times, temps, self.colors(len(records)))
+
+    def _rasterize(self):
+        '''Renders the figure on the Agg canvas. With fixed limits the background is kept
+        and only the curve is drawn over it, until the legend changes.'''
+        canvas = self.figure.canvas
+        if self.limits is None:
+            canvas.draw()
+            return
+        key = (self._legendPhases, tuple(tuple(line.get_color()) for line in self._legend.get_lines()))
+        if key != self._backgroundKey:
+            self._lines.set_visible(False)
+            self._points.set_visible(False)
+            canvas.draw()
+            self._lines.set_visible(True)
+            self._points.set_visible(True)
+            self._background = canvas.copy_from_bbox(self.figure.bbox)
+            self._backgroundKey = key
+        canvas.restore_region(self._background)
+        self.axes.draw_artist(self._lines)
+        self.axes.draw_artist(self._points)
+
+    def render(self, curve, out, format = None):
+        '''Draws the curve and saves the image to a path or file object, format from the suffix unless given.
+        PNGs are encoded straight from the Agg buffer, other formats go through savefig.'''
+        if isinstance(curve, (bytes, bytearray, memoryview)):
+            self.draw_bytes(curve)
+        else:
+            self.draw(curve)
+        if format is None:
+            format = os.path.splitext(out)[1][1:].lower() if isinstance(out, (str, os.PathLike)) else "png"
+        if format != "png":
+            self.figure.savefig(out, format=format)
+            return
+        from PIL import Image
+        self._rasterize()
+        width, height = self.figure.canvas.get_width_height()
+        image = Image.frombuffer("RGBA", (width, height), self.figure.canvas.buffer_rgba(), "raw", "RGBA", 0, 1)
+        image.save(out, format="png", compress_level=self.png_compression, dpi=(self.figure.dpi, self.figure.dpi))
+
+
+def _serialized(curves):
+    '''Yields every curve as to_bytes output, expanding firingCurveBatches row by row'''
+    for curve in curves:
+        if isinstance(curve, (bytes, bytearray, memoryview)):
+            yield bytes(curve)
+        elif isinstance(curve, firingCurveBatch):
+            records = _phaseRecords(curve.velocities, curve.endTemps, curve.holdingTimes, curve.times)
+            for roomTemp, row in zip(curve.roomTemps.tolist(), records):
+                yield _CURVE_HEADER.pack(_CURVE_MAGIC, roomTemp, len(row)) + row.tobytes()
+        else:
+            yield curve.to_bytes()
+
+
+# Renderer of a render worker process, made once by _init_render_worker
+_renderer = None
+
+
+def _init_render_worker(figsize, dpi, limits):
+    global _renderer
+    _renderer = CurveRenderer(figsize=figsize, dpi=dpi, limits=limits)
+
+
+def _render_chunk(items, format):
+    for data, out in items:
+        _renderer.render(data, out, format)
+    return len(items)
+
+
+def render_curves(curves, paths, workers = None, chunk_size = 64, format = None, figsize = (10, 6), dpi = 100,
+                  limits = None):
+    '''Renders curve i to paths[i] in a process pool, each worker reusing one renderer.
+    curves may hold firingCurves, compactFiringCurves, to_bytes output and firingCurveBatches
+    (one image per row). Curves are sent to the workers serialized, a few chunks at a time.
+    Giving limits (see CurveRenderer) puts every image on the same axes and is much faster.
+    Returns the number of images, the time taken and the throughput.'''
+    workers = workers or os.cpu_count() or 1
+    items = zip(_serialized(curves), paths)
+    chunks = iter(lambda: list(itertools.islice(items, chunk_size)), [])
+    start = time.perf_counter()
+    images = 0
+    if workers == 1:
+        _init_render_worker(figsize, dpi, limits)
+        for chunk in chunks:
+            images += _render_chunk(chunk, format)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_render_worker,
+                                                    initargs=(figsize, dpi, limits)) as executor:
+            pending = collections.deque()
+            for chunk in itertools.chain(chunks, [None]):
+                if chunk is not None:
+                    pending.append(executor.submit(_render_chunk, chunk, format))
+                while pending and (chunk is None or len(pending) >= 2*workers):
+                    images += pending.popleft().result()
+    seconds = time.perf_counter() - start
+    return {"images": images, "seconds": round(seconds, 3), "images_per_s": round(images / seconds, 1), "workers": workers}
@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import multiprocessing
+import sys
+import time
+import urllib.parse
+
+import numpy as np
+
+from firing_curve import GlassTypeHandler, ORDER_FIELDS, _json_rows, _order_from_row, generate_records
+
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+          500: "Internal Server Error"}
+MAX_BODY = 64 << 20
+MAX_TRACE_SAMPLES = 250000
+
+
+# Handler of a batch worker, loaded once by _init_batch_worker
+_batchHandler = None
+
+
+def _init_batch_worker(json_filepath):
+    global _batchHandler
+    _batchHandler = GlassTypeHandler(json_filepath)
+
+
+def _batch_chunk(lines, extrapolate):
+    '''Turns a chunk of the request body, as raw JSON lines, into the response's JSON lines.
+    Runs in a worker, so neither the parsing nor the encoding happens on the event loop.'''
+    records = generate_records(_batchHandler, _json_rows(lines.decode("utf-8").splitlines()),
+                               extrapolate=extrapolate)
+    return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+
+
+class _Metrics:
+    '''Request counts, errors and latency percentiles over the most recent requests, per endpoint'''
+    def __init__(self, window = 2048):
+        self.started = time.monotonic()
+        self.window = window
+        self.counts = collections.Counter()
+        self.errors = collections.Counter()
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+        self.computations = 0
+        self.coalesced = 0
+        self.inflight = 0
+
+    def record(self, endpoint, nanoseconds, ok):
+        self.counts[endpoint] += 1
+        if not ok:
+            self.errors[endpoint] += 1
+        self.latencies[endpoint].append(nanoseconds)
+
+    def snapshot(self):
+        uptime = time.monotonic() - self.started
+        requests = sum(self.counts.values())
+        endpoints = {}
+        for endpoint, count in self.counts.items():
+            p50, p95, p99 = np.percentile(self.latencies[endpoint], [50, 95, 99]) / 1e6
+            endpoints[endpoint] = {"requests": count, "errors": self.errors[endpoint],
+                                   "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+        return {"uptime_s": round(uptime, 1), "requests": requests, "requests_per_s": round(requests / uptime, 1),
+                "inflight": self.inflight, "computations": self.computations, "coalesced": self.coalesced,
+                "endpoints": endpoints}
+
+
+class CurveServer:
+    '''HTTP service for curve generation on asyncio, with the tables loaded once.
+
+    GET /curve, /total-time and /trace take the ORDER_FIELDS as query parameters (plus
+    extrapolate=1, and interval=seconds for /trace, at most MAX_TRACE_SAMPLES samples). POST /batch takes JSON lines of orders
+    and answers JSON lines like the command line does. GET /metrics reports request counts,
+    latencies and how many requests were coalesced.
+
+    Identical single-curve requests that arrive while the curve is being computed share
+    that one computation. Single curves are computed on a small thread pool and batches on
+    a process pool, so neither blocks the event loop.'''
+    def __init__(self, json_filepath = "tables.json", threads = 2, workers = 1, batch_chunk_size = 2000):
+        self.json_filepath = json_filepath
+        self.handler = GlassTypeHandler(json_filepath)
+        self.batch_chunk_size = batch_chunk_size
+        self.metrics = _Metrics()
+        self._inflight = {}
+        self._threads = concurrent.futures.ThreadPoolExecutor(threads)
+        if workers > 0:
+            # Workers are spawned, since forking a process that already runs threads can deadlock the child
+            self._processes = concurrent.futures.ProcessPoolExecutor(workers, multiprocessing.get_context("spawn"),
+                                                                     _init_batch_worker, (json_filepath,))
+        else:
+            # Batches on the thread pool, e.g. where processes cannot be started
+            _init_batch_worker(json_filepath)
+            self._processes = self._threads
+        self._routes = {("GET", "/curve"): self._curve, ("GET", "/total-time"): self._total_time,
+                        ("GET", "/trace"): self._trace, ("POST", "/batch"): self._batch,
+                        ("GET", "/metrics"): self._metrics}
+
+    def _compute(self, order, extrapolate):
+        return self.handler.batch_curves(*(order[field] for field in ORDER_FIELDS),
+                                         interpolate=True, extrapolate=extrapolate)
+
+    async def _order_batch(self, query):
+        '''The one-curve firingCurveBatch for the order in the query, shared with identical requests in flight'''
+        order = _order_from_row(query)
+        extrapolate = query.get("extrapolate", "0") not in ("0", "", "false")
+        key = (*order.values(), extrapolate)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.metrics.coalesced += 1
+            return order, await asyncio.shield(future)
+        future = asyncio.get_running_loop().run_in_executor(self._threads, self._compute, order, extrapolate)
+        self._inflight[key] = future
+        self.metrics.computations += 1
+        try:
+            return order, await asyncio.shield(future)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _curve(self, query, body):
+        order, batch = await self._order_batch(query)
+        phases = [{"startTemp": s, "endTemp": e, "velocity": v, "holdingTime": h, "time": t}
+                  for s, e, v, h, t in zip(batch.startTemps[0].tolist(), batch.endTemps[0].tolist(),
+                                           batch.velocities[0].tolist(), batch.holdingTimes[0].tolist(),
+                                           batch.times[0].tolist())]
+        return {**order, "phases": phases, "totalTime": int(batch.totalTimes[0])}
+
+    async def _total_time(self, query, body):
+        order, batch = await self._order_batch(query)
+        hours, minutes = divmod(int(batch.totalTimes[0]), 60)
+        return {**order, "totalTime": int(batch.totalTimes[0]), "text": f"{hours} timmar och {minutes} minuter"}
+
+    @staticmethod
+    def _trace_body(order, batch, interval):
+        '''The /trace response already encoded. The temperatures are encoded a slice at a time,
+        so the thread doing it lets the event loop have the GIL in between.'''
+        temps = batch.sampleTraces(interval)[0].round(2)
+        pieces = [json.dumps(temps[start:start + 8192].tolist())[1:-1] for start in range(0, len(temps), 8192)]
+        head = json.dumps({**order, "interval": interval}, ensure_ascii=False)[:-1]
+        return f'{head}, "temps": [{", ".join(pieces)}]}}'.encode("utf-8")
+
+    async def _trace(self, query, body):
+        interval = float(query.get("interval", 10))
+        if not interval > 0:
+            raise ValueError("interval must be positive")
+        order, batch = await self._order_batch(query)
+        samples = batch.traceSamples(interval)
+        if samples > MAX_TRACE_SAMPLES:
+            raise ValueError(f"interval {interval} gives {samples} samples, at most {MAX_TRACE_SAMPLES} are allowed")
+        return await asyncio.get_running_loop().run_in_executor(self._threads, self._trace_body, order, batch, interval)
+
+    async def _batch(self, query, body):
+        extrapolate = query.get("extrapolate", "0") not in ("0", "", "false")
+        # The body is only cut at line ends into pieces of about batch_chunk_size lines, judged from
+        # the average line length, so the event loop does no per-line work. The workers parse and encode.
+        step = max(1, len(body) * self.batch_chunk_size // (body.count(b"\n") + 1))
+        loop = asyncio.get_running_loop()
+        chunks = []
+        start = 0
+        while start < len(body):
+            end = body.find(b"\n", start + step)
+            end = len(body) if end < 0 else end + 1
+            chunks.append(loop.run_in_executor(self._processes, _batch_chunk, body[start:end], extrapolate))
+            start = end
+        return await asyncio.gather(*chunks)
+
+    async def _metrics(self, query, body):
+        return self.metrics.snapshot()
+
+    async def _respond(self, method, target, body):
+        '''Status and JSON response for one request'''
+        url = urllib.parse.urlsplit(target)
+        route = self._routes.get((method, url.path))
+        if route is None:
+            if any(path == url.path for _, path in self._routes):
+                return url.path, 405, {"error": f"{method} not allowed for {url.path}"}
+            # Not counted under its own path, so stray requests cannot grow the metrics
+            return "other", 404, {"error": f"Unknown path {url.path}"}
+        query = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            return url.path, 200, await route(query, body)
+        except (ValueError, TypeError) as error:
+            return url.path, 400, {"error": str(error)}
+
+    async def _connection(self, reader, writer):
+        '''Serves HTTP/1.1 requests on one connection until the client closes it'''
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                start = time.perf_counter_ns()
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, version = (lines[0].split(" ") + ["", ""])[:3]
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # The body cannot be framed, so the connection is closed after the answer
+                    path, status, result = "other", 400, {"error": "Invalid Content-Length"}
+                    keep_alive = False
+                elif length > MAX_BODY:
+                    path, status, result = "other", 413, {"error": "Request body too large"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    keep_alive = (headers.get("connection", "").lower() != "close") if version == "HTTP/1.1" \
+                        else headers.get("connection", "").lower() == "keep-alive"
+                    self.metrics.inflight += 1
+                    try:
+                        path, status, result = await self._respond(method, target, body)
+                    except Exception as error:
+                        path, status, result = "other", 500, {"error": repr(error)}
+                    finally:
+                        self.metrics.inflight -= 1
+
+                if isinstance(result, list):
+                    # JSON lines from /batch, written piece by piece instead of joined into one big copy
+                    pieces, content_type = result, "application/x-ndjson"
+                elif isinstance(result, bytes):
+                    pieces, content_type = [result], "application/json"
+                else:
+                    pieces, content_type = [json.dumps(result, ensure_ascii=False).encode("utf-8")], "application/json"
+                head = (f"HTTP/1.1 {status} {STATUS[status]}\r\nContent-Type: {content_type}; charset=utf-8\r\n"
+                        f"Content-Length: {sum(map(len, pieces))}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1")
+                if len(pieces) == 1:
+                    writer.write(head + pieces[0])
+                else:
+                    writer.write(head)
+                    for piece in pieces:
+                        writer.write(piece)
+                        await writer.drain()
+                await writer.drain()
+                self.metrics.record(path, time.perf_counter_ns() - start, status == 200)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def start(self, host = "127.0.0.1", port = 8080):
+        '''Starts listening and returns the asyncio server, port 0 picks a free port'''
+        return await asyncio.start_server(self._connection, host, port)
+
+    def close(self):
+        self._threads.shutdown()
+        self._processes.shutdown()
+
+
+async def _serve(args):
+    server = CurveServer(args.tables, args.threads, args.workers)
+    listener = await server.start(args.host, args.port)
+    host, port = listener.sockets[0].getsockname()[:2]
+    print(f"Serving firing curves on http://{host}:{port}", file=sys.stderr)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Serve firing curves over HTTP.")
+    parser.add_argument("--tables", default="tables.json")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--threads", type=int, default=2, help="threads computing single curves")
+    parser.add_argument("--workers", type=int, default=1, help="processes computing batches, 0 runs them on the threads")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,35 @@
 import numpy as np
 import json
-import matplotlib.pyplot as plt
 import os
-import matplotlib.colors as mcolors
+import sys
+import csv
+import argparse
+import itertools
+import collections
+import concurrent.futures
+import time
+import functools
+import random
+import contextlib
+import mmap
+import struct
+import bisect
+
+# matplotlib is imported inside the plotting code so computing curves never pays for it
+
+@functools.lru_cache(maxsize=1 << 16)
+def _phaseTime(velocity, startTemp, endTemp, holdingTime):
+    '''Minutes to go from start to end temperature at velocity (degrees/hour) and then hold.
+    Integer ceiling division, memoized since catalogs repeat the same phases over and over.'''
+    if velocity == 0:
+        return int(holdingTime)
+    return int(-(-abs(endTemp - startTemp) * 60 // abs(velocity)) + holdingTime)
+
 
 class _Phase:
+    __slots__ = ('_velocity', '_endTemp', '_holdingTime', '_index', '_nextPhase', '_prevPhase',
+                 '_startTemp', '_time', '_color')
+
     def __init__(self, velocity = 1, endTemp = 0, holdingTime = 0, index = 0, startTemp = None):
         '''Initializing a new Phase in the firing curve'''
         self._velocity = int(velocity)
@@ -13,22 +38,24 @@ class _Phase:
         self._index = index
         self._nextPhase = None
         self._prevPhase = None
-        self._setStartTemp(startTemp)
-        self._color = None  # New attribute to store the color
+        self._startTemp = startTemp
+        self._time = self._calculateTime()
+        self._color = None  # Only set when the curve is plotted
         
     def _calculateTime(self):
         '''Calculates time based on start and end temperature, speed and holding time'''
-        if self._velocity == 0:
-            return self._holdingTime
-        else:
-            calculated_time_minutes = np.ceil(abs((self._endTemp - self._startTemp) / (self._velocity/60)) + self._holdingTime).astype(int)
-            
-            return calculated_time_minutes
+        return _phaseTime(self._velocity, self._startTemp, self._endTemp, self._holdingTime)
+
+    def _recalculate(self):
+        '''Recalculates the time of the phase and returns the change in time'''
+        old = self._time
+        self._time = self._calculateTime()
+        return self._time - old
 
     def _setStartTemp(self, newStarttemp):
-        '''Sets the starting temperature and recalculates the time for the current phase.'''
+        '''Sets the starting temperature, recalculates the time for the current phase and returns the change in time'''
         self._startTemp = newStarttemp
-        self._time = self._calculateTime()
+        return self._recalculate()
     
     def _findNext(self):
         return self._nextPhase
@@ -38,22 +65,24 @@ class _Phase:
 
     def _changeEndTemp(self, newEndTemp):
         '''Changes the final temperature and recalculates the time for the 
-        current phase, sets start temp for next to this end temp'''
+        current phase, sets start temp for next to this end temp.
+        Returns the change in time of the two phases'''
         self._endTemp = newEndTemp
-        self._time = self._calculateTime()
+        change = self._recalculate()
 
         if self._nextPhase:
-            self._nextPhase._setStartTemp(self._endTemp)
+            change += self._nextPhase._setStartTemp(self._endTemp)
+        return change
 
     def _changeVelocity(self, newVelocity):
-        '''Changes hastiness and recalculates time for current phase'''
+        '''Changes hastiness, recalculates time for current phase and returns the change in time'''
         self._velocity = newVelocity
-        self._time = self._calculateTime()
+        return self._recalculate()
     
     def _changeHoldingTime(self, newHoldingTime):
-        '''Changes Hold Time and recalculates time for the current phase'''
+        '''Changes Hold Time, recalculates time for the current phase and returns the change in time'''
         self._holdingTime = newHoldingTime
-        self._time = self._calculateTime()
+        return self._recalculate()
             
     
 class firingCurve:
@@ -65,23 +94,68 @@ class firingCurve:
         self._lastPhase = None
         self._roomTemp = roomTemp
         self._currentPhase = None  # For iteration
+        self._transactionDepth = 0
+        self._dirtyFrom = None  # Lowest index edited in the current transaction
         
     
     def _uppdateIndexAndTime(self, startPhase):
-        '''Updates the index and total time of the curve'''
+        '''Brings index and start temperature of every phase up to date and sums the total time again'''
         if startPhase is None:
             return
-        current = startPhase
-        index = 0
-        time = 0
+        current = self._firstPhase
+        if current._startTemp != self._roomTemp:
+            current._setStartTemp(self._roomTemp)
+        index = time = 0
         while current is not None:
             current._index = index
             time += current._time
-            if current._nextPhase:
-                current._nextPhase._startTemp = current._endTemp
+            if current._nextPhase and current._nextPhase._startTemp != current._endTemp:
+                current._nextPhase._setStartTemp(current._endTemp)
             current = current._nextPhase
             index += 1
         self._totalTime = time
+
+    def _updateFrom(self, index, phase = None):
+        '''Updates index and start temperature of the phases from index onwards. Only phases whose
+        start temperature changes get a new time, and the total time is adjusted by the difference,
+        so the phases before index are not visited at all when phase, the phase at index, is given.'''
+        if self._firstPhase is None:
+            self._totalTime = 0
+            return
+        if phase is None:
+            # Start one phase early so the edited phase gets its predecessor's end temperature
+            index = max(min(index, self._totalPhases - 1) - 1, 0)
+            phase = self.findPhase(index)
+        if phase is self._firstPhase and phase._startTemp != self._roomTemp:
+            self._totalTime += phase._setStartTemp(self._roomTemp)
+        while phase is not None:
+            phase._index = index
+            if phase._nextPhase and phase._nextPhase._startTemp != phase._endTemp:
+                self._totalTime += phase._nextPhase._setStartTemp(phase._endTemp)
+            phase = phase._nextPhase
+            index += 1
+
+    def _edited(self, index, phase = None):
+        '''Brings indices and start temperatures up to date after a phase was added or removed at index,
+        or notes the index if a transaction is open so it is done once when the transaction ends'''
+        if self._transactionDepth:
+            self._dirtyFrom = index if self._dirtyFrom is None else min(self._dirtyFrom, index)
+        else:
+            self._updateFrom(index, phase)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        '''Groups edits so indices and start temperatures are brought up to date once, from the lowest
+        index edited, when the block ends. Inside the block the total time can miss the start temperature
+        change of a phase that follows a removed one, so read it after the block.'''
+        self._transactionDepth += 1
+        try:
+            yield self
+        finally:
+            self._transactionDepth -= 1
+            if self._transactionDepth == 0 and self._dirtyFrom is not None:
+                dirtyFrom, self._dirtyFrom = self._dirtyFrom, None
+                self._updateFrom(dirtyFrom)
     
     def _clear(self):
         '''Empty the curve'''
@@ -97,12 +171,8 @@ class firingCurve:
             index = self._totalPhases
         if index < 0 or index > self._totalPhases:
             raise IndexError("Index outside of interval")
-        if index == 0 and self._firstPhase is not None:
-            startTemp = self._roomTemp
-        elif self._firstPhase and index > 0:
-            startTemp = self.findPhase(index-1)._endTemp
-        else:
-            startTemp = self._roomTemp  # First phase in empty list
+        prev = self.findPhase(index - 1) if index > 0 else None  # Previous phase, walked to from the closer end
+        startTemp = prev._endTemp if prev else self._roomTemp  # A first phase starts at room temperature
       
         newPhase = _Phase(velocity, endTemp, holdingTime, index, startTemp)
         
@@ -121,16 +191,14 @@ class firingCurve:
                 self._firstPhase = newPhase
             self._lastPhase = newPhase 
         else:  # Insert to middle
-            prev = self._firstPhase
-            for _ in range(index - 1):
-                prev = prev._nextPhase  # Move previous to correct position
             newPhase._nextPhase = prev._nextPhase  # The new phase's next phase is the previous's current next phase
             newPhase._prevPhase = prev  # The previous phase of the new phase is the previous one
             prev._nextPhase._prevPhase = newPhase  # The next phase after the previous one must now point back to the new phase
             prev._nextPhase = newPhase  # The previous next phase is now the new phase
         
         self._totalPhases += 1
-        self._uppdateIndexAndTime(self._firstPhase)
+        self._totalTime += newPhase._time
+        self._edited(index, newPhase)
     
     def removePhase(self, index):
         '''Deletes phase with given index provided it exists'''
@@ -138,57 +206,127 @@ class firingCurve:
             raise IndexError("Index outside of interval.")
         elif self._totalPhases == 1:
             self._clear()
+            self._edited(index)
+            return
+        if index == 0:
+            removed = self._firstPhase
+            self._firstPhase = self._firstPhase._nextPhase
+            self._firstPhase._prevPhase = None
+            if self._totalPhases == 2:
+                self._lastPhase = self._firstPhase
         else:
-            if index == 0:
-                self._firstPhase = self._firstPhase._nextPhase
-                self._firstPhase._prevPhase = None
-                if self._totalPhases == 2:
-                    self._lastPhase = self._firstPhase
+            removed = self.findPhase(index)
+            if not removed._nextPhase:
+                self._lastPhase = removed._prevPhase
+                self._lastPhase._nextPhase = None
             else:
-                current = self._firstPhase
-                for _ in range(index):   #Found the phase to be removed. index = 3:  # _= 0: index0 -> index1
-                    current = current._nextPhase                                 # _= 1: index1 -> index2
-                                                                                     # _= 2: intex2 -> index3
-                if not current._nextPhase:
-                    self._lastPhase = current._prevPhase
-                    self._lastPhase._nextPhase = None
-                else:
-                    current._prevPhase._nextPhase = current._nextPhase
-                    current._nextPhase._prevPhase = current._prevPhase
-            self._totalPhases -= 1  # Reduce the number of phases in the list
-        self._uppdateIndexAndTime(self._firstPhase)
+                removed._prevPhase._nextPhase = removed._nextPhase
+                removed._nextPhase._prevPhase = removed._prevPhase
+        self._totalPhases -= 1  # Reduce the number of phases in the list
+        self._totalTime -= removed._time
+        # The phase before the removed one is where start temperatures may have to change
+        if index == 0:
+            self._edited(0, self._firstPhase)
+        else:
+            self._edited(index - 1, removed._prevPhase)
     
     def findPhase(self, index): # O(n) since we need to go through the list
-        '''Finds phase with given index'''
+        '''Finds phase with given index, walking from whichever end of the list is closer'''
         if index < 0 or index >= self._totalPhases:
             return None
+        if index > self._totalPhases // 2:
+            current = self._lastPhase
+            for _ in range(self._totalPhases - 1 - index):
+                current = current._prevPhase
+            return current
         current = self._firstPhase
         for _ in range(index):
             current = current._nextPhase
         return current
     
     def changePhaseEndTemp(self, index, newEndTemp):
-        '''Changes the final temperature of a phase and updates the index and time'''
+        '''Changes the final temperature of a phase and updates the time'''
         fas = self.findPhase(index)
-        fas._changeEndTemp(newEndTemp)
-        self._uppdateIndexAndTime(self._firstPhase)
+        self._totalTime += fas._changeEndTemp(newEndTemp)
         
     def changePhaseVelocity(self, index, newVelocity):
-        '''Changes the velocity of a phase and updates the index and time'''
+        '''Changes the velocity of a phase and updates the time'''
         fas = self.findPhase(index)
-        fas._changeVelocity(newVelocity)
-        self._uppdateIndexAndTime(self._firstPhase)
+        self._totalTime += fas._changeVelocity(newVelocity)
         
     def changePhaseHoldingTime(self, index, newHoldingTime):
-        '''Changes a phase's holding time and updates the index and time'''
+        '''Changes a phase's holding time and updates the time'''
         fas = self.findPhase(index)
-        fas._changeHoldingTime(newHoldingTime)
-        self._uppdateIndexAndTime(self._firstPhase)
+        self._totalTime += fas._changeHoldingTime(newHoldingTime)
     
     def getTotalTime(self):
         hours, minutes = divmod(self._totalTime, 60)
         return f"{hours} timmar och {minutes} minuter"
+
+    def to_bytes(self):
+        '''The curve in binary form: a header followed by one fixed-width PHASE_RECORD per phase'''
+        return _curveToBytes(self)
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''Curve from to_bytes output, or from any buffer holding it such as a memoryview of a mmap'''
+        return cls._fromRecords(*_readCurve(data))
+
+    @classmethod
+    def _fromRecords(cls, roomTemp, records):
+        '''Curve from an array of PHASE_RECORDs, linked directly in one pass'''
+        curve = cls(roomTemp)
+        prev = None
+        startTemp = roomTemp
+        for index, (velocity, endTemp, holdingTime, _) in enumerate(records.tolist()):
+            phase = _Phase(velocity, endTemp, holdingTime, index, startTemp)
+            phase._prevPhase = prev
+            if prev:
+                prev._nextPhase = phase
+            else:
+                curve._firstPhase = phase
+            curve._totalTime += phase._time
+            prev = phase
+            startTemp = endTemp
+        curve._lastPhase = prev
+        curve._totalPhases = len(records)
+        return curve
+
+    def _columns(self):
+        '''Velocities, start temperatures, end temperatures, holding times and times of the phases as arrays'''
+        return np.array([(p._velocity, p._startTemp, p._endTemp, p._holdingTime, p._time) for p in self],
+                        dtype=np.int64).reshape(-1, 5).T
+
+    def breakpoints(self):
+        '''Times (minutes) and temperatures where the piecewise-linear temperature profile changes slope'''
+        return _breakpoints(self._roomTemp, *self._columns())
+
+    def traceSamples(self, intervalSeconds = 10):
+        '''Number of samples sampleTrace returns for the interval'''
+        return _traceSamples(self._totalTime, intervalSeconds)
+
+    def sampleTrace(self, intervalSeconds = 10, out = None):
+        '''Setpoint temperature every intervalSeconds from start to end of the program.
+        Written into out if given, e.g. a preallocated array or np.memmap of length traceSamples().'''
+        return _sampleTrace(*self.breakpoints(), self.traceSamples(intervalSeconds), intervalSeconds, out)
     
+    def _quickHealthy(self): # O(1), only looks at the ends of the list
+        '''Checking what can be seen from the ends of the list: the phase count against the last index,
+        the end links, the first start temperature and that the total time covers the end phases.
+        The total time itself is only summed and compared by _healthy().'''
+        if self._totalPhases == 0:
+            assert self._firstPhase is None
+            assert self._lastPhase is None
+            assert self._totalTime == 0
+        else:
+            assert self._firstPhase._findPrev() is None
+            assert self._lastPhase._findNext() is None
+            assert self._firstPhase._index == 0
+            assert self._lastPhase._index == self._totalPhases - 1
+            assert self._firstPhase._startTemp == self._roomTemp
+            ends = self._firstPhase._time + (self._lastPhase._time if self._totalPhases > 1 else 0)
+            assert self._totalTime >= ends
+
     def _healthy(self): # O(n) since we need to go through the list
         '''Checking the health of the list'''
         if self._totalPhases == 0:
@@ -236,24 +374,811 @@ class firingCurve:
             self._currentPhase = self._currentPhase._nextPhase
             return phase
 
+
+class _PhaseView:
+    '''Read-only view of one phase in a compactFiringCurve.
+    Exposes the same attributes as _Phase so plotting and printing code works unchanged.
+    A view is bound to an index, so it goes stale if phases before it are added or removed.'''
+    __slots__ = ('_curve', '_index')
+
+    def __init__(self, curve, index):
+        self._curve = curve
+        self._index = index
+
+    @property
+    def _velocity(self):
+        return int(self._curve._velocities[self._index])
+
+    @property
+    def _endTemp(self):
+        return int(self._curve._endTemps[self._index])
+
+    @property
+    def _holdingTime(self):
+        return int(self._curve._holdingTimes[self._index])
+
+    @property
+    def _startTemp(self):
+        return int(self._curve._startTemps[self._index])
+
+    @property
+    def _time(self):
+        return int(self._curve._times[self._index])
+
+    @property
+    def _color(self):
+        return self._curve._colors[self._index]
+
+    @_color.setter
+    def _color(self, color):
+        self._curve._colors[self._index] = color
+
+    @property
+    def _nextPhase(self):
+        return self._curve.findPhase(self._index + 1)
+
+    @property
+    def _prevPhase(self):
+        return self._curve.findPhase(self._index - 1)
+
+    def _findNext(self):
+        return self._nextPhase
+
+    def _findPrev(self):
+        return self._prevPhase
+
+
+class compactFiringCurve:
+    '''Firing curve stored as contiguous NumPy columns instead of a linked list.
+    Has the same public API as firingCurve, but findPhase is O(1) and an edit only
+    touches the edited phase, its successor and the running total.'''
+    def __init__(self, roomTemp, capacity = 16):
+        '''Initializes an empty glass firing curve with room for capacity phases'''
+        self._totalPhases = 0
+        self._totalTime = 0
+        self._roomTemp = roomTemp
+        self._currentIndex = 0  # For iteration
+        self._allocate(max(int(capacity), 1))
+
+    def _allocate(self, capacity):
+        self._velocities = np.zeros(capacity, dtype=np.int64)
+        self._endTemps = np.zeros(capacity, dtype=np.int64)
+        self._holdingTimes = np.zeros(capacity, dtype=np.int64)
+        self._startTemps = np.zeros(capacity, dtype=np.int64)
+        self._times = np.zeros(capacity, dtype=np.int64)
+        self._startTimes = np.zeros(capacity + 1, dtype=np.int64)  # Prefix sums of _times
+        self._startTimesValid = 0  # _startTimes[:_startTimesValid + 1] is up to date
+        self._colors = []
+
+    def _grow(self):
+        '''Doubles the capacity of every column, keeping the stored phases'''
+        n = self._totalPhases
+        old = (self._velocities, self._endTemps, self._holdingTimes, self._startTemps, self._times, self._startTimes)
+        colors = self._colors
+        valid = self._startTimesValid
+        self._allocate(2 * len(self._velocities))
+        new = (self._velocities, self._endTemps, self._holdingTimes, self._startTemps, self._times, self._startTimes)
+        for oldColumn, newColumn in zip(old, new):
+            newColumn[:n] = oldColumn[:n]
+        self._startTimes[n] = old[-1][n]
+        self._startTimesValid = valid
+        self._colors = colors
+
+    def _invalidateFrom(self, index):
+        '''Marks start times after the given phase as out of date'''
+        self._startTimesValid = min(self._startTimesValid, index)
+
+    def _refreshPhase(self, index):
+        '''Recalculates the time of one phase and returns the change in time'''
+        old = int(self._times[index])
+        new = _phaseTime(int(self._velocities[index]), int(self._startTemps[index]),
+                         int(self._endTemps[index]), int(self._holdingTimes[index]))
+        self._times[index] = new
+        return new - old
+
+    def _setStartTemp(self, index, startTemp):
+        '''Sets start temperature of a phase if it exists and returns the change in time'''
+        if index >= self._totalPhases or self._startTemps[index] == startTemp:
+            return 0
+        self._startTemps[index] = startTemp
+        return self._refreshPhase(index)
+
+    def _uppdateIndexAndTime(self, startPhase = None):
+        '''Recalculates start temperatures, times and total time of the whole curve'''
+        n = self._totalPhases
+        if n == 0:
+            self._totalTime = 0
+            return
+        self._startTemps[0] = self._roomTemp
+        self._startTemps[1:n] = self._endTemps[:n-1]
+        self._times[:n] = _phaseTimes(*self._columns()[:4])
+        self._totalTime = int(self._times[:n].sum())
+        self._invalidateFrom(0)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        '''Same API as firingCurve.transaction. Edits here are already O(1) and the start-time
+        prefix sums are only recomputed when read, so there is nothing left to defer.'''
+        yield self
+
+    def _clear(self):
+        '''Empty the curve'''
+        self._totalPhases = 0
+        self._totalTime = 0
+        self._colors = []
+        self._startTimesValid = 0
+
+    def newPhase(self, velocity = 1, endTemp = 0, holdingTime = 0, index = None):
+        '''Adds new phase at the intended location, 
+        if no index is specified it is added last'''
+        n = self._totalPhases
+        if index is None:
+            index = n
+        if index < 0 or index > n:
+            raise IndexError("Index outside of interval")
+        if n == len(self._velocities):
+            self._grow()
+        if index < n:  # Make room by shifting the tail one step
+            for column in (self._velocities, self._endTemps, self._holdingTimes, self._startTemps, self._times):
+                column[index+1:n+1] = column[index:n]
+        self._colors.insert(index, None)
+
+        self._velocities[index] = int(velocity)
+        self._endTemps[index] = int(endTemp)
+        self._holdingTimes[index] = int(holdingTime)
+        self._startTemps[index] = self._endTemps[index-1] if index > 0 else self._roomTemp
+        self._times[index] = 0
+        self._totalPhases = n + 1
+
+        self._totalTime += self._refreshPhase(index) + self._setStartTemp(index + 1, self._endTemps[index])
+        self._invalidateFrom(index)
+
+    def removePhase(self, index):
+        '''Deletes phase with given index provided it exists'''
+        n = self._totalPhases
+        if index < 0 or index >= n:
+            raise IndexError("Index outside of interval.")
+        if n == 1:
+            self._clear()
+            return
+        self._totalTime -= int(self._times[index])
+        for column in (self._velocities, self._endTemps, self._holdingTimes, self._startTemps, self._times):
+            column[index:n-1] = column[index+1:n]
+        del self._colors[index]
+        self._totalPhases = n - 1
+
+        startTemp = self._endTemps[index-1] if index > 0 else self._roomTemp
+        self._totalTime += self._setStartTemp(index, startTemp)
+        self._invalidateFrom(index)
+
+    def findPhase(self, index): # O(1) since phases are stored in arrays
+        '''Finds phase with given index'''
+        if index < 0 or index >= self._totalPhases:
+            return None
+        return _PhaseView(self, index)
+
+    def _checkIndex(self, index):
+        if index < 0 or index >= self._totalPhases:
+            raise IndexError("Index outside of interval.")
+
+    def changePhaseEndTemp(self, index, newEndTemp):
+        '''Changes the final temperature of a phase and updates the time'''
+        self._checkIndex(index)
+        self._endTemps[index] = int(newEndTemp)
+        self._totalTime += self._refreshPhase(index) + self._setStartTemp(index + 1, self._endTemps[index])
+        self._invalidateFrom(index)
+
+    def changePhaseVelocity(self, index, newVelocity):
+        '''Changes the velocity of a phase and updates the time'''
+        self._checkIndex(index)
+        self._velocities[index] = int(newVelocity)
+        self._totalTime += self._refreshPhase(index)
+        self._invalidateFrom(index)
+
+    def changePhaseHoldingTime(self, index, newHoldingTime):
+        '''Changes a phase's holding time and updates the time'''
+        self._checkIndex(index)
+        self._holdingTimes[index] = int(newHoldingTime)
+        self._totalTime += self._refreshPhase(index)
+        self._invalidateFrom(index)
+
+    def phaseStartTimes(self):
+        '''Returns the start time in minutes of every phase plus the end time of the curve.
+        The prefix sums are only recomputed from the first phase edited since the last call.'''
+        n = self._totalPhases
+        valid = self._startTimesValid
+        if valid < n:
+            np.cumsum(self._times[valid:n], out=self._startTimes[valid+1:n+1])
+            self._startTimes[valid+1:n+1] += self._startTimes[valid]
+            self._startTimesValid = n
+        return self._startTimes[:n+1]
+
+    def getTotalTime(self):
+        hours, minutes = divmod(self._totalTime, 60)
+        return f"{hours} timmar och {minutes} minuter"
+
+    def to_bytes(self):
+        '''The curve in binary form: a header followed by one fixed-width PHASE_RECORD per phase'''
+        return _curveToBytes(self)
+
+    @classmethod
+    def from_bytes(cls, data):
+        '''Curve from to_bytes output, or from any buffer holding it such as a memoryview of a mmap'''
+        return cls._fromRecords(*_readCurve(data))
+
+    @classmethod
+    def _fromRecords(cls, roomTemp, records):
+        '''Curve from an array of PHASE_RECORDs, copied column by column. The stored times are used as they are.'''
+        n = len(records)
+        curve = cls(roomTemp, capacity=n)
+        curve._velocities[:n] = records["velocity"]
+        curve._endTemps[:n] = records["endTemp"]
+        curve._holdingTimes[:n] = records["holdingTime"]
+        curve._times[:n] = records["time"]
+        if n:
+            curve._startTemps[0] = roomTemp
+            curve._startTemps[1:n] = curve._endTemps[:n-1]
+        curve._colors = [None] * n
+        curve._totalPhases = n
+        curve._totalTime = int(curve._times[:n].sum())
+        return curve
+
+    def _columns(self):
+        '''Velocities, start temperatures, end temperatures, holding times and times of the phases as arrays'''
+        n = self._totalPhases
+        return self._velocities[:n], self._startTemps[:n], self._endTemps[:n], self._holdingTimes[:n], self._times[:n]
+
+    def breakpoints(self):
+        '''Times (minutes) and temperatures where the piecewise-linear temperature profile changes slope'''
+        return _breakpoints(self._roomTemp, *self._columns())
+
+    def traceSamples(self, intervalSeconds = 10):
+        '''Number of samples sampleTrace returns for the interval'''
+        return _traceSamples(self._totalTime, intervalSeconds)
+
+    def sampleTrace(self, intervalSeconds = 10, out = None):
+        '''Setpoint temperature every intervalSeconds from start to end of the program.
+        Written into out if given, e.g. a preallocated array or np.memmap of length traceSamples().'''
+        return _sampleTrace(*self.breakpoints(), self.traceSamples(intervalSeconds), intervalSeconds, out)
+
+    def _quickHealthy(self): # O(1)
+        '''Checking the phase count against the columns and the first start temperature, and the total
+        time against the start-time prefix sums: equal when they are up to date, otherwise at least
+        the start time of the first phase edited since they were.'''
+        n = self._totalPhases
+        assert 0 <= n <= len(self._velocities)
+        assert len(self._colors) == n
+        if n == 0:
+            assert self._totalTime == 0
+        else:
+            assert self._startTemps[0] == self._roomTemp
+            if self._startTimesValid == n:
+                assert self._startTimes[n] == self._totalTime
+            else:
+                assert self._totalTime >= self._startTimes[self._startTimesValid]
+
+    def _healthy(self): # O(n), but vectorized over the columns
+        '''Checking the health of the arrays'''
+        n = self._totalPhases
+        assert len(self._colors) == n
+        if n == 0:
+            assert self._totalTime == 0
+            return
+        assert self._startTemps[0] == self._roomTemp
+        assert np.array_equal(self._startTemps[1:n], self._endTemps[:n-1])
+        assert np.array_equal(self._times[:n], _phaseTimes(*self._columns()[:4]))
+        assert int(self._times[:n].sum()) == self._totalTime
+        assert self.phaseStartTimes()[-1] == self._totalTime
+
+    @property
+    def _firstPhase(self):
+        return self.findPhase(0)
+
+    @property
+    def _lastPhase(self):
+        return self.findPhase(self._totalPhases - 1)
+
+    def __iter__(self):
+        #Allows iteration over the phases
+        self._currentIndex = 0
+        return self
+
+    def __next__(self):
+        if self._currentIndex >= self._totalPhases:
+            raise StopIteration
+        phase = _PhaseView(self, self._currentIndex)
+        self._currentIndex += 1
+        return phase
+
+class firingCurveBatch:
+    '''Many generated firing programs stored as (curves x phases) NumPy arrays.
+    Row i holds one program; firingCurve objects are only built when asked for.'''
+    def __init__(self, roomTemps, velocities, endTemps, holdingTimes):
+        self.roomTemps = np.asarray(roomTemps, dtype=np.int64)
+        self.velocities = np.asarray(velocities, dtype=np.int64)
+        self.endTemps = np.asarray(endTemps, dtype=np.int64)
+        self.holdingTimes = np.asarray(holdingTimes, dtype=np.int64)
+        self.startTemps = np.empty_like(self.endTemps)
+        self.startTemps[:, 0] = self.roomTemps
+        self.startTemps[:, 1:] = self.endTemps[:, :-1]
+        self.times = _phaseTimes(self.velocities, self.startTemps, self.endTemps, self.holdingTimes)
+        self.totalTimes = self.times.sum(axis=1)
+
+    def __len__(self):
+        return len(self.roomTemps)
+
+    def curve(self, i, curveClass = None):
+        '''Builds the firing curve in row i, as a firingCurve unless another class is given'''
+        curve = (curveClass or firingCurve)(int(self.roomTemps[i]))
+        for velocity, endTemp, holdingTime in zip(self.velocities[i].tolist(), self.endTemps[i].tolist(), self.holdingTimes[i].tolist()):
+            curve.newPhase(velocity, endTemp, holdingTime)
+        return curve
+
+    def curves(self, curveClass = None):
+        '''Yields one firing curve per row'''
+        for i in range(len(self)):
+            yield self.curve(i, curveClass)
+
+    def breakpoints(self):
+        '''Breakpoint times and temperatures of every row, as (curves x 2*phases+1) arrays'''
+        return _breakpoints(self.roomTemps, self.velocities, self.startTemps, self.endTemps, self.holdingTimes, self.times)
+
+    def traceSamples(self, intervalSeconds = 10):
+        '''Samples per row sampleTraces returns for the interval, set by the longest program'''
+        return _traceSamples(int(self.totalTimes.max(initial=0)), intervalSeconds)
+
+    def sampleTraces(self, intervalSeconds = 10, out = None, rowsPerChunk = None):
+        '''Setpoint temperature of every row every intervalSeconds, as a (curves x traceSamples()) array.
+        Rows that end before the longest program stay at their final temperature. Rows are
+        interpolated a chunk at a time straight into out, which may be a np.memmap.'''
+        samples = self.traceSamples(intervalSeconds)
+        if out is None:
+            out = np.empty((len(self), samples))
+        elif out.shape != (len(self), samples):
+            raise ValueError(f"out must have shape {(len(self), samples)}")
+        times, temps = self.breakpoints()
+        rowsPerChunk = rowsPerChunk or max(1, _TRACE_CHUNK // max(samples, 1))
+        for start in range(0, len(self), rowsPerChunk):
+            rows = slice(start, start + rowsPerChunk)
+            _sampleRows(times[rows], temps[rows], samples, intervalSeconds, out[rows])
+        return out
+
+
+# Samples interpolated per step when writing traces, bounds the temporary memory used
+_TRACE_CHUNK = 1 << 20
+
+
+def _breakpoints(roomTemp, velocities, startTemps, endTemps, holdingTimes, times):
+    '''Breakpoints of the temperature profile for phase arrays of shape (..., phases).
+    Each phase ramps from its start to its end temperature and then holds for its holding time;
+    a phase with velocity 0 stays at its start temperature for its whole time.'''
+    ends = np.cumsum(times, axis=-1)
+    rampEnds = np.where(velocities == 0, ends, ends - holdingTimes)
+    rampTemps = np.where(velocities == 0, startTemps, endTemps)
+    shape = np.shape(times)[:-1] + (2*np.shape(times)[-1] + 1,)
+    pointTimes = np.zeros(shape)
+    pointTemps = np.empty(shape)
+    pointTemps[..., 0] = roomTemp
+    pointTimes[..., 1::2] = rampEnds
+    pointTimes[..., 2::2] = ends
+    pointTemps[..., 1::2] = rampTemps
+    pointTemps[..., 2::2] = endTemps
+    return pointTimes, pointTemps
+
+
+def _traceSamples(totalTime, intervalSeconds):
+    return int(totalTime * 60 // intervalSeconds) + 1
+
+
+def _sampleTrace(times, temps, samples, intervalSeconds, out = None):
+    '''np.interp of one profile at every intervalSeconds, written into out a chunk at a time'''
+    if out is None:
+        out = np.empty(samples)
+    elif len(out) != samples:
+        raise ValueError(f"out must have length {samples}")
+    for start in range(0, samples, _TRACE_CHUNK):
+        sampleTimes = np.arange(start, min(start + _TRACE_CHUNK, samples)) * (intervalSeconds / 60)
+        out[start:start + _TRACE_CHUNK] = np.interp(sampleTimes, times, temps)
+    return out
+
+
+def _sampleRows(xp, fp, samples, intervalSeconds, out):
+    '''np.interp of every row of xp/fp at 0, intervalSeconds, 2*intervalSeconds, ... written into out.
+    Since the samples are evenly spaced, the samples falling in each segment can be counted directly
+    and the segment's slope and intercept repeated that many times, without a loop over rows.'''
+    rows, points = xp.shape
+    perMinute = 60 / intervalSeconds
+    # First sample of each segment; the last segment runs flat from the final breakpoint to the end of the row
+    firstSample = np.minimum(np.ceil(xp * perMinute), samples).astype(np.int64)
+    firstSample[:, 0] = 0
+    counts = np.diff(firstSample, axis=1, append=samples).ravel()
+    dx = np.diff(xp, axis=1, append=xp[:, -1:] + 1)
+    dy = np.diff(fp, axis=1, append=fp[:, -1:])
+    slopes = np.divide(dy, dx, out=np.zeros_like(dy), where=dx > 0)
+    intercepts = fp - xp * slopes
+    np.multiply(np.repeat(slopes.ravel(), counts).reshape(rows, samples), np.arange(samples) / perMinute, out=out)
+    out += np.repeat(intercepts.ravel(), counts).reshape(rows, samples)
+
+
+def _stackBreakpoints(curves):
+    '''Breakpoints of many curves as (curves x points) arrays, shorter curves padded with their last point'''
+    if isinstance(curves, firingCurveBatch):
+        return curves.breakpoints()
+    points = [curve.breakpoints() for curve in curves]
+    width = max((len(times) for times, _ in points), default=1)
+    stacked = np.empty((2, len(points), width))
+    for i, (times, temps) in enumerate(points):
+        stacked[0, i, :len(times)] = times
+        stacked[0, i, len(times):] = times[-1]
+        stacked[1, i, :len(temps)] = temps
+        stacked[1, i, len(temps):] = temps[-1]
+    return stacked[0], stacked[1]
+
+
+def _timeAbove(times, temps, threshold):
+    '''Minutes each row of a piecewise-linear profile spends above threshold, exact per segment'''
+    durations = np.diff(times, axis=-1)
+    high = np.maximum(temps[..., :-1], temps[..., 1:])
+    low = np.minimum(temps[..., :-1], temps[..., 1:])
+    threshold = np.asarray(threshold, dtype=float)[..., None]
+    rise = high - low
+    fraction = np.where(rise > 0, np.clip((high - threshold) / np.where(rise > 0, rise, 1), 0, 1), low > threshold)
+    return (durations * fraction).sum(axis=-1)
+
+
+def compare_curves(reference, candidates, o_astemp, n_astemp, intervalSeconds = 60, rowsPerChunk = None):
+    '''Compares candidates, a list of curves or a firingCurveBatch, with a reference curve.
+
+    Every curve is sampled every intervalSeconds on one common time grid, as long as the
+    longest program, with curves that have ended staying at their final temperature.
+    Returns arrays with one value per candidate: the largest temperature difference to the
+    reference on the grid and the minute it occurs, the minutes above o_astemp and in the
+    annealing band between n_astemp and o_astemp (exact, from the breakpoints), and the
+    difference in total time. The reference's own values are under "reference".'''
+    refTimes, refTemps = reference.breakpoints()
+    times, temps = _stackBreakpoints(candidates)
+    totalTimes = times[:, -1]
+    samples = _traceSamples(max(refTimes[-1], totalTimes.max(initial=0)), intervalSeconds)
+    refTrace = _sampleTrace(refTimes, refTemps, samples, intervalSeconds)
+
+    maxDeviation = np.empty(len(times))
+    maxDeviationAt = np.empty(len(times))
+    rowsPerChunk = rowsPerChunk or max(1, _TRACE_CHUNK // samples)
+    buffer = np.empty((min(rowsPerChunk, len(times)), samples))
+    for start in range(0, len(times), rowsPerChunk):
+        rows = slice(start, start + rowsPerChunk)
+        trace = buffer[:len(times[rows])]
+        _sampleRows(times[rows], temps[rows], samples, intervalSeconds, trace)
+        trace -= refTrace
+        np.abs(trace, out=trace)
+        worst = trace.argmax(axis=1)
+        maxDeviation[rows] = trace[np.arange(len(worst)), worst]
+        maxDeviationAt[rows] = worst * intervalSeconds / 60
+
+    aboveLow = _timeAbove(times, temps, n_astemp)
+    aboveHigh = _timeAbove(times, temps, o_astemp)
+    refAboveLow = _timeAbove(refTimes, refTemps, n_astemp)
+    refAboveHigh = _timeAbove(refTimes, refTemps, o_astemp)
+    return {"max_deviation": maxDeviation, "max_deviation_at": maxDeviationAt,
+            "time_above_o_astemp": aboveHigh, "time_in_annealing_band": aboveLow - aboveHigh,
+            "total_time_delta": totalTimes - refTimes[-1],
+            "reference": {"time_above_o_astemp": float(refAboveHigh),
+                          "time_in_annealing_band": float(refAboveLow - refAboveHigh), "total_time": float(refTimes[-1])}}
+
+
+def _phaseTimes(velocities, startTemps, endTemps, holdingTimes):
+    '''Vectorized _phaseTime over integer arrays of phases'''
+    speeds = np.abs(velocities)
+    rampTimes = -(-np.abs(endTemps - startTemps) * 60 // np.where(speeds == 0, 1, speeds))
+    return np.where(velocities == 0, holdingTimes, rampTimes + holdingTimes).astype(np.int64)
+
+
+# Binary layout of one phase. The start temperature is left out since it is the previous phase's
+# end temperature, or the room temperature in the header for the first phase.
+PHASE_RECORD = np.dtype([("velocity", "<i4"), ("endTemp", "<i4"), ("holdingTime", "<i4"), ("time", "<i4")])
+# A single serialized curve: magic, room temperature and number of phases, followed by the phases
+_CURVE_HEADER = struct.Struct("<4sii")
+_CURVE_MAGIC = b"FCv1"
+# A curve file: magic, version, number of curves and where the index starts, followed by the
+# phases of every curve back to back and then the index, which is the first phase of each
+# curve (plus one past the end) as int64 and the room temperatures as int32
+_FILE_HEADER = struct.Struct("<4sIQQ")
+_FILE_MAGIC = b"FCcf"
+_FILE_VERSION = 1
+
+
+def _phaseRecords(velocities, endTemps, holdingTimes, times):
+    '''PHASE_RECORD array from phase columns of any shape'''
+    records = np.empty(np.shape(velocities), dtype=PHASE_RECORD)
+    records["velocity"] = velocities
+    records["endTemp"] = endTemps
+    records["holdingTime"] = holdingTimes
+    records["time"] = times
+    return records
+
+
+def _curveToBytes(curve):
+    velocities, _, endTemps, holdingTimes, times = curve._columns()
+    return (_CURVE_HEADER.pack(_CURVE_MAGIC, curve._roomTemp, len(velocities))
+            + _phaseRecords(velocities, endTemps, holdingTimes, times).tobytes())
+
+
+def _readCurve(data):
+    '''Room temperature and the phases of a serialized curve, the phases as a read-only view into data'''
+    if len(data) < _CURVE_HEADER.size:
+        raise ValueError("Not a serialized firing curve")
+    magic, roomTemp, phases = _CURVE_HEADER.unpack_from(data)
+    if magic != _CURVE_MAGIC:
+        raise ValueError("Not a serialized firing curve")
+    return roomTemp, np.frombuffer(data, dtype=PHASE_RECORD, count=phases, offset=_CURVE_HEADER.size)
+
+
+class CurveFileWriter:
+    '''Writes many curves to one binary file that CurveFile can open with mmap.
+    Phases are streamed to disk as they come, only the small per-curve index is kept in memory.'''
+    def __init__(self, path):
+        self._file = open(path, "wb")
+        self._file.write(_FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, 0, 0))
+        self._offsets = [np.zeros(1, dtype=np.int64)]
+        self._roomTemps = []
+        self._phases = 0
+        self.curves = 0
+
+    def _append(self, roomTemps, phaseCounts, records):
+        self._file.write(records.tobytes())
+        self._offsets.append(self._phases + np.cumsum(phaseCounts, dtype=np.int64))
+        self._roomTemps.append(np.asarray(roomTemps, dtype=np.int32))
+        self._phases += int(np.sum(phaseCounts))
+        self.curves += len(self._roomTemps[-1])
+
+    def add(self, curve):
+        '''Appends a firingCurve or compactFiringCurve'''
+        velocities, _, endTemps, holdingTimes, times = curve._columns()
+        self._append([curve._roomTemp], [len(velocities)], _phaseRecords(velocities, endTemps, holdingTimes, times))
+
+    def add_batch(self, batch):
+        '''Appends every row of a firingCurveBatch in one write'''
+        records = _phaseRecords(batch.velocities, batch.endTemps, batch.holdingTimes, batch.times)
+        self._append(batch.roomTemps, np.full(len(batch), batch.velocities.shape[1]), records.ravel())
+
+    def close(self):
+        '''Writes the index and the header, returns the number of curves'''
+        indexOffset = _FILE_HEADER.size + self._phases * PHASE_RECORD.itemsize
+        for offsets in self._offsets:
+            self._file.write(offsets.tobytes())
+        for roomTemps in self._roomTemps:
+            self._file.write(roomTemps.tobytes())
+        self._file.seek(0)
+        self._file.write(_FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, self.curves, indexOffset))
+        self._file.close()
+        return self.curves
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_curve_file(path, curves):
+    '''Writes curves, firingCurveBatches or a mix of both to a binary curve file. Returns the number of curves.'''
+    with CurveFileWriter(path) as writer:
+        for curve in curves:
+            if isinstance(curve, firingCurveBatch):
+                writer.add_batch(curve)
+            else:
+                writer.add(curve)
+    return writer.curves
+
+
+class CurveFile:
+    '''A binary curve file opened with mmap. Nothing is read up front: looking up curve i only
+    touches its index entries and its own phases, so a worker can use one curve of a huge catalog
+    without loading the rest. The phases are returned as read-only views into the mapping.'''
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, curves, indexOffset = _FILE_HEADER.unpack_from(self._map)
+        if magic != _FILE_MAGIC or version != _FILE_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a curve file")
+        self._offsets = np.frombuffer(self._map, dtype=np.int64, count=curves + 1, offset=indexOffset)
+        self.roomTemps = np.frombuffer(self._map, dtype=np.int32, count=curves, offset=indexOffset + 8*(curves + 1))
+        self._records = np.frombuffer(self._map, dtype=PHASE_RECORD, count=int(self._offsets[-1]),
+                                      offset=_FILE_HEADER.size)
+
+    def __len__(self):
+        return len(self.roomTemps)
+
+    def records(self, i):
+        '''The PHASE_RECORDs of curve i, without copying'''
+        if not -len(self) <= i < len(self):
+            raise IndexError("Curve index outside of file")
+        i %= len(self)
+        return self._records[self._offsets[i]:self._offsets[i + 1]]
+
+    def total_time(self, i):
+        return int(self.records(i)["time"].sum())
+
+    def curve(self, i, curveClass = None):
+        '''Builds curve i, as a firingCurve unless another class is given'''
+        return (curveClass or firingCurve)._fromRecords(int(self.roomTemps[i]), self.records(i))
+
+    def to_bytes(self, i):
+        '''Curve i in the format of firingCurve.to_bytes, without building the curve'''
+        records = self.records(i)
+        return _CURVE_HEADER.pack(_CURVE_MAGIC, int(self.roomTemps[i]), len(records)) + records.tobytes()
+
+    def close(self):
+        '''Unmaps the file. Record views handed out must be dropped first.'''
+        del self._offsets, self.roomTemps, self._records
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _TableGrid:
+    '''One time table from tables.json as a dense (radius x layers) array.
+    Radius and layer values are mapped to array positions through small lookup arrays,
+    so a lookup is plain array indexing instead of a scan over the row dicts.
+    Single values are answered from a plain dict and plain Python arithmetic, since
+    NumPy's per-call overhead is far larger than the lookup itself.'''
+    def __init__(self, table):
+        rows = {int(r): {int(l): t for l, t in layers.items()} for row in table for r, layers in row.items()}
+        self.radii = np.array(sorted(rows))
+        self.layers = np.array(sorted({l for row in rows.values() for l in row}))
+        self.grid = np.array([[rows[r][l] for l in self.layers] for r in self.radii])
+        self._radiusPositions = self._positionMap(self.radii)
+        self._layerPositions = self._positionMap(self.layers)
+        self._times = {(r, l): t for r, row in rows.items() for l, t in row.items()}
+        self._radiiList = self.radii.tolist()
+        self._layersList = self.layers.tolist()
+        self._gridList = self.grid.tolist()
+
+    @staticmethod
+    def _positionMap(keys):
+        positions = np.full(keys.max() + 1, -1)
+        positions[keys] = np.arange(len(keys))
+        return positions
+
+    @staticmethod
+    def _positions(positionMap, values):
+        '''Array positions of the given key values, -1 where a value is not a key'''
+        values = np.asarray(values)
+        ints = values.astype(np.int64)
+        found = (ints == values) & (ints >= 0) & (ints < len(positionMap))
+        return np.where(found, positionMap[np.where(found, ints, 0)], -1)
+
+    def lookup(self, radius, layers):
+        '''Times for (arrays of) exact radius and layer values'''
+        if isinstance(radius, _SCALARS) and isinstance(layers, _SCALARS):
+            try:
+                return self._times[radius, layers]
+            except KeyError:
+                raise ValueError("Radius or layers not found in the table") from None
+        r = self._positions(self._radiusPositions, radius)
+        l = self._positions(self._layerPositions, layers)
+        if np.any(r < 0) or np.any(l < 0):
+            raise ValueError("Radius or layers not found in the table")
+        times = self.grid[r, l]
+        return times.item() if times.ndim == 0 else times
+
+    def interpolate(self, radius, layers, extrapolate = False):
+        '''Bilinearly interpolated times for (arrays of) any radius and layer values.
+        Values outside the table raise ValueError, or are clamped to its edges if extrapolate is set.'''
+        if isinstance(radius, _SCALARS) and isinstance(layers, _SCALARS):
+            return self._interpolateOne(radius, layers, extrapolate)
+        radius = np.asarray(radius, dtype=float)
+        layers = np.asarray(layers, dtype=float)
+        if not extrapolate and (np.any(radius < self.radii[0]) or np.any(radius > self.radii[-1])
+                                or np.any(layers < self.layers[0]) or np.any(layers > self.layers[-1])):
+            raise ValueError("Radius or layers outside the table")
+        radius = np.clip(radius, self.radii[0], self.radii[-1])
+        layers = np.clip(layers, self.layers[0], self.layers[-1])
+
+        # Lower grid corner of each query and its fractional distance to the upper corner
+        i = (np.searchsorted(self.radii, radius, side='right') - 1).clip(0, len(self.radii) - 2)
+        j = (np.searchsorted(self.layers, layers, side='right') - 1).clip(0, len(self.layers) - 2)
+        tr = (radius - self.radii[i]) / (self.radii[i+1] - self.radii[i])
+        tl = (layers - self.layers[j]) / (self.layers[j+1] - self.layers[j])
+
+        g = self.grid
+        times = ((g[i, j]*(1 - tr) + g[i+1, j]*tr)*(1 - tl)
+                 + (g[i, j+1]*(1 - tr) + g[i+1, j+1]*tr)*tl)
+        return times.item() if times.ndim == 0 else times
+
+    def _interpolateOne(self, radius, layers, extrapolate):
+        '''interpolate for one radius and layer count, the table value itself when both are keys'''
+        time = self._times.get((radius, layers))
+        if time is not None:
+            return time
+        radii, layerList = self._radiiList, self._layersList
+        if not extrapolate and not (radii[0] <= radius <= radii[-1] and layerList[0] <= layers <= layerList[-1]):
+            raise ValueError("Radius or layers outside the table")
+        radius = float(min(max(radius, radii[0]), radii[-1]))
+        layers = float(min(max(layers, layerList[0]), layerList[-1]))
+        i = min(max(bisect.bisect_right(radii, radius) - 1, 0), len(radii) - 2)
+        j = min(max(bisect.bisect_right(layerList, layers) - 1, 0), len(layerList) - 2)
+        tr = (radius - radii[i]) / (radii[i+1] - radii[i])
+        tl = (layers - layerList[j]) / (layerList[j+1] - layerList[j])
+        g = self._gridList
+        return ((g[i][j]*(1 - tr) + g[i+1][j]*tr)*(1 - tl)
+                + (g[i][j+1]*(1 - tr) + g[i+1][j+1]*tr)*tl)
+
+
+# Types that _TableGrid answers without NumPy
+_SCALARS = (int, float, np.integer, np.floating)
+
+# Parsed and indexed tables, shared by all handlers in the process.
+# Keyed on path, modification time and size so an edited file is read again.
+_tablesCache = {}
+
+
 class GlassTypeHandler:
-    def __init__(self, json_filepath):
+    TABLE_SECTIONS = ("Tider for uppvarmning", "Halltider", "Avspanningstider")
+    VALIDATION_MODES = ("off", "sampled", "always")
+    # Hold minutes and room temperatures the prompts allow
+    MINUTES = range(1, 16)
+    ROOM_TEMPS = range(10, 31)
+
+    def __init__(self, json_filepath, validation = None, sample_rate = None):
+        '''validation decides how curves are checked while they are built: "off"; "sampled", the default,
+        with O(1) checks after every phase and the full _healthy() on a sample_rate fraction of the curves;
+        or "always", the full _healthy() after every phase. FIRING_CURVE_VALIDATION and
+        FIRING_CURVE_SAMPLE_RATE set the defaults, e.g. to turn on "always" in debugging and tests.'''
         self.json_filepath = json_filepath
-        self.glass_data = self._load_json_data()
+        self.validation = validation or os.environ.get("FIRING_CURVE_VALIDATION", "sampled")
+        self.sample_rate = float(sample_rate if sample_rate is not None else os.environ.get("FIRING_CURVE_SAMPLE_RATE", 0.01))
+        if self.validation not in self.VALIDATION_MODES:
+            raise ValueError(f"validation must be one of {', '.join(self.VALIDATION_MODES)}")
+        self.glass_data, self._glass_index, self._table_index = self._load_tables()
 
-    def _load_json_data(self):
+    def _json_file_path(self):
         # Get the absolute path to the directory containing this script
         script_dir = os.path.dirname(os.path.abspath(__file__))
         # Build the full path to the JSON file
-        json_file_path = os.path.join(script_dir, self.json_filepath)
+        return os.path.join(script_dir, self.json_filepath)
+
+    def _load_tables(self):
+        '''Returns the glass data with its name index and table index, parsing the
+        file only if no handler in this process has loaded the same version of it'''
+        try:
+            stat = os.stat(self._json_file_path())
+            key = (self._json_file_path(), stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            key = None
+        cached = _tablesCache.get(key)
+        if cached is None:
+            glass_data = self._load_json_data()
+            glass_index = {glass["namn"]: glass for glass in glass_data["Glassorter"]}
+            table_index = {section: {(item["kategori"], item.get("ugn")): _TableGrid(item["tabell"])
+                                     for item in glass_data[section]}
+                           for section in self.TABLE_SECTIONS}
+            cached = (glass_data, glass_index, table_index)
+            _tablesCache[key] = cached
+        return cached
+
+    def _table(self, section, kategori, oven_type = None):
+        '''The indexed table for a category (and oven type, for heating times)'''
+        try:
+            return self._table_index[section][(kategori, oven_type)]
+        except KeyError:
+            raise ValueError(f"No table in '{section}' for {kategori} {oven_type or ''}".rstrip()) from None
+
+    def _load_json_data(self):
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        json_file_path = self._json_file_path()
 
         # Try to open and load the JSON file
         try:
             with open(json_file_path, 'r', encoding='utf-8') as file:
                 return json.load(file)
         except FileNotFoundError:
-            print(f"Filen '{self.json_filepath}' kunde inte hittas i katalogen '{script_dir}'.")
-            exit(1)
+            raise FileNotFoundError(f"Filen '{self.json_filepath}' kunde inte hittas i katalogen '{script_dir}'.") from None
 
     def get_glass_info(self):
         print("Vilken typ av glas ska du bränna?")
@@ -267,16 +1192,18 @@ class GlassTypeHandler:
         
         return glass_options[choice]
     
-    def get_user_preferences(self, glass_info):
-        # Determine allowed oven types based on glass category
-        allowed_oven_types = []
+    def allowed_oven_types(self, glass_info):
+        '''Oven types, t (top heated) and s (side heated), allowed for the glass category'''
         if glass_info['kategori'] == "floatglas":
-            allowed_oven_types = ['t']
+            return ['t']
         elif glass_info['kategori'] == "COE-90/COE-96-glas":
-            allowed_oven_types = ['t', 's']
+            return ['t', 's']
         else:
             # Default to both oven types if other categories are added in the future
-            allowed_oven_types = ['t', 's']
+            return ['t', 's']
+
+    def get_user_preferences(self, glass_info):
+        allowed_oven_types = self.allowed_oven_types(glass_info)
         
         # Map for display purposes
         oven_type_display = {'t': 'toppvärmd', 's': 'sidovärmd'}
@@ -303,30 +1230,38 @@ class GlassTypeHandler:
                     print("Ogiltigt val. Vänligen ange ett giltigt nummer.")
 
 
-        # Radius Selection
-        valid_radii = [5, 10, 20, 30, 40, 50, 60]
+        # Radius Selection, any value inside the tables is interpolated
+        min_radius, max_radius = 5, 60
         while True:
-            print("Vilken är din största radie? \nBara 5, 10, 20, 30, 40, 50, 60 är tillåtna")
-            radius_input = input("Skriv ett tal och klicka enter: ").strip()
-            if radius_input.isdigit() and int(radius_input) in valid_radii:
-                radius = int(radius_input)
+            print(f"Vilken är din största radie? \nVärden från {min_radius} till {max_radius} är tillåtna")
+            radius_input = input("Skriv ett tal och klicka enter: ").strip().replace(',', '.')
+            try:
+                radius = float(radius_input)
+            except ValueError:
+                radius = None
+            if radius is not None and min_radius <= radius <= max_radius:
+                radius = int(radius) if radius.is_integer() else radius
                 break
             else:
-                print(f"Ogiltig dimension. Tillåtna värden är: {', '.join(map(str, valid_radii))}")
+                print(f"Ogiltig dimension. Tillåtna värden är: {min_radius} till {max_radius}")
 
-        # Layers Selection
-        valid_layers = [1, 2, 3, 4, 5]
+        # Layers Selection, any value inside the tables is interpolated
+        min_layers, max_layers = 1, 5
         while True:
-            print("Hur många lager har du som mest? \nBara heltal 1 till 5 är tillåtna")
-            layers_input = input("Skriv en siffra och klicka enter: ").strip()
-            if layers_input.isdigit() and int(layers_input) in valid_layers:
-                layers = int(layers_input)
+            print(f"Hur många lager har du som mest? \nVärden från {min_layers} till {max_layers} är tillåtna")
+            layers_input = input("Skriv ett tal och klicka enter: ").strip().replace(',', '.')
+            try:
+                layers = float(layers_input)
+            except ValueError:
+                layers = None
+            if layers is not None and min_layers <= layers <= max_layers:
+                layers = int(layers) if layers.is_integer() else layers
                 break
             else:
-                print(f"Ogiltigt antal lager. Tillåtna värden är: {', '.join(map(str, valid_layers))}")
+                print(f"Ogiltigt antal lager. Tillåtna värden är: {min_layers} till {max_layers}")
 
         # Minutes Selection
-        valid_minutes = list(range(1, 16))
+        valid_minutes = list(self.MINUTES)
         while True:
             print("Hur många minuter vill du stanna på topptemperatur? \nBara heltal 1 till 15 är tillåtna")
             minutes_input = input("Skriv en siffra och klicka enter: ").strip()
@@ -337,7 +1272,7 @@ class GlassTypeHandler:
                 print(f"Ogiltigt antal minuter. Tillåtna värden är: {', '.join(map(str, valid_minutes))}")
 
         # Room Temperature Selection
-        valid_temps = list(range(10, 31))
+        valid_temps = list(self.ROOM_TEMPS)
         while True:
             print("Vilken rumstemperatur har du i din verkstad? \nBara heltal 10 till 30 är tillåtna")
             room_temp_input = input("Skriv en siffra och klicka enter: ").strip()
@@ -386,42 +1321,123 @@ class GlassTypeHandler:
               '\nrumstemperatur =',room_temp, 
               '\nbränningstyp =',firing_type)
         
+        topptemp = self._topptemp(glass_info, firing_type)
+        print(f"topptemp = {topptemp} grader Celsius\n")
+
+        uppvarmning_time, halltider_time, avspanning_time = self._table_times(glass_info, oven_type, radius, layers)
+        
+        return glass_info, uppvarmning_time, halltider_time, avspanning_time, topptemp, minutes, room_temp
+
+    def _topptemp(self, glass_info, firing_type):
+        '''Top temperature for fullfusing (f), slumping (s) or tackfusing (t)'''
         if firing_type == "f":
-            topptemp = round((glass_info.get("f_topptemp")[0] + glass_info.get("f_topptemp")[1]) / 2)
-            print(f"topptemp = {topptemp} grader Celsius\n")
+            return round((glass_info.get("f_topptemp")[0] + glass_info.get("f_topptemp")[1]) / 2)
         elif firing_type == "s":
-            topptemp = round((glass_info.get("s_topptemp")[0] + glass_info.get("s_topptemp")[1]) / 2)
-            print(f"topptemp = {topptemp} grader Celsius\n")
+            return round((glass_info.get("s_topptemp")[0] + glass_info.get("s_topptemp")[1]) / 2)
         elif firing_type == "t":
-            topptemp = glass_info.get("t_topptemp")
-            print(f"topptemp = {topptemp} grader Celsius\n")
-        
-        # Extracting the uppvarmning_table
-        uppvarmning_table = next(
-            item["tabell"] for item in self.glass_data["Tider for uppvarmning"]
-            if item["kategori"] == glass_info["kategori"] and item["ugn"] == oven_type
-        )
-
-        # Extracting the halltider_table
-        halltider_table = next(
-            item["tabell"] for item in self.glass_data["Halltider"]
-            if item["kategori"] == glass_info["kategori"]
-        )
-
-        # Extracting the avspanning_table
-        avspanning_table = next(
-            item["tabell"] for item in self.glass_data["Avspanningstider"]
-            if item["kategori"] == glass_info["kategori"]
-        )
-        
-        uppvarmning_time = self.get_time_from_table(uppvarmning_table, radius, layers)
-        halltider_time = self.get_time_from_table(halltider_table, radius, layers)
-        avspanning_time = self.get_time_from_table(avspanning_table, radius, layers)
-        
-        return glass_info, uppvarmning_time, halltider_time, avspanning_time, topptemp, minutes, room_temp
+            return glass_info.get("t_topptemp")
+        raise ValueError("Firing type must be 'f', 's' or 't'")
+
+    def _table_times(self, glass_info, oven_type, radius, layers, extrapolate = False):
+        '''Heating, hold and annealing times from the tables indexed at load time, interpolated between table values'''
+        uppvarmning_time = self._table("Tider for uppvarmning", glass_info["kategori"], oven_type).interpolate(radius, layers, extrapolate)
+        halltider_time = self._table("Halltider", glass_info["kategori"]).interpolate(radius, layers, extrapolate)
+        avspanning_time = self._table("Avspanningstider", glass_info["kategori"]).interpolate(radius, layers, extrapolate)
+        return uppvarmning_time, halltider_time, avspanning_time
         
     def firing_curve_creator(self):
-        glass_info, uppvarmning_time, halltider_time, avspanning_time, topptemp, minutes, room_temp = self.data_finder()
+        return self._build_curve(*self.data_finder())
+
+    def curve_from_parameters(self, glass_name, oven_type, radius, layers, minutes, room_temp, firing_type, extrapolate = False):
+        '''Non-interactive firing_curve_creator, raises ValueError for unknown or incompatible parameters'''
+        self._check_limits(minutes, room_temp)
+        glass_info = self.glass_by_name(glass_name)
+        topptemp = self._topptemp(glass_info, firing_type)
+        times = self._table_times(glass_info, oven_type, radius, layers, extrapolate)
+        return self._build_curve(glass_info, *times, topptemp, minutes, room_temp)
+
+    @classmethod
+    def _check_limits(cls, minutes, room_temp):
+        '''Raises ValueError unless the hold minutes and room temperature are within what the prompts allow'''
+        if not cls.MINUTES[0] <= minutes <= cls.MINUTES[-1]:
+            raise ValueError(f"Minutes must be {cls.MINUTES[0]}-{cls.MINUTES[-1]}, got {minutes}")
+        if not cls.ROOM_TEMPS[0] <= room_temp <= cls.ROOM_TEMPS[-1]:
+            raise ValueError(f"Room temperature must be {cls.ROOM_TEMPS[0]}-{cls.ROOM_TEMPS[-1]}, got {room_temp}")
+
+    def check_order(self, glass_name, oven_type, radius, layers, minutes, room_temp, firing_type, extrapolate = False):
+        '''Raises ValueError with the reason if the order cannot be made into a curve, without computing it'''
+        self._check_limits(minutes, room_temp)
+        glass_info = self.glass_by_name(glass_name)
+        if oven_type not in self.allowed_oven_types(glass_info):
+            raise ValueError(f"Oven type '{oven_type}' is not allowed for {glass_name}")
+        self._topptemp(glass_info, firing_type)
+        for section in self.TABLE_SECTIONS:
+            table = self._table(section, glass_info["kategori"], oven_type if section == "Tider for uppvarmning" else None)
+            if not extrapolate and not (table.radii[0] <= radius <= table.radii[-1]
+                                        and table.layers[0] <= layers <= table.layers[-1]):
+                raise ValueError(f"Radius {radius} or layers {layers} outside the table")
+
+    def _topptemp_range(self, glass_info, firing_type):
+        '''Lowest and highest allowed top temperature for the firing type'''
+        if firing_type == "t":
+            return glass_info["t_topptemp"], glass_info["t_topptemp"]
+        self._topptemp(glass_info, firing_type)  # Validates the firing type
+        low, high = glass_info[f"{firing_type}_topptemp"]
+        return low, high
+
+    def shortest_curve(self, glass_name, oven_type, radius, layers, minutes, room_temp, firing_type,
+                       holds = range(1, 16), top_step = 1, velocity_steps = 20, extrapolate = False):
+        '''Searches top temperatures in the firing type's range, hold times and the velocities to
+        and from the top for the shortest program that is still safe, and returns it as a firingCurve.
+
+        A candidate is safe if no phase is faster than the table times allow (the same bounds
+        firing_curve_creator uses) and the glass spends at least as long above the lowest top
+        temperature as in the standard program with the given minutes. A hotter top can then
+        replace hold time, and a slower ramp around the top counts towards the time above it.
+        The first heating and the annealing phases do not affect safety beyond their bounds,
+        so they stay at them. All candidates are scored at once as NumPy arrays.'''
+        self._check_limits(minutes, room_temp)
+        glass_info = self.glass_by_name(glass_name)
+        uppvarmning_time, halltider_time, avspanning_time = self._table_times(glass_info, oven_type, radius, layers, extrapolate)
+        low, high = self._topptemp_range(glass_info, firing_type)
+        o_astemp = glass_info["o_astemp"]
+        n_astemp = glass_info["n_astemp"]
+        inledande_smaltpunkt = self.glass_data["Inledande_smaltpunkt"]
+
+        def time_above_low(tops, holds, heating, cooling):
+            return (tops - low)*60/heating + holds + (tops - low)*60/np.abs(cooling)
+
+        def cooling_bound(tops):
+            return np.trunc(60*(o_astemp - tops)/halltider_time)
+
+        standard_top = self._topptemp(glass_info, firing_type)
+        required = time_above_low(standard_top, minutes, 999, cooling_bound(standard_top))
+
+        # Every combination of top temperature, hold, heating velocity to the top and
+        # fraction of the fastest allowed cooling velocity from it
+        fractions = np.arange(1, velocity_steps + 1) / velocity_steps
+        tops, holds, heating, fraction = (a.ravel() for a in np.meshgrid(
+            np.arange(low, high + 1, top_step), np.asarray(holds), np.unique(np.trunc(999*fractions)), fractions, indexing='ij'))
+        cooling = np.minimum(np.trunc(cooling_bound(tops)*fraction), -1)
+        safe = time_above_low(tops, holds, heating, cooling) >= required - 1e-9
+        if not np.any(safe):
+            raise ValueError("No candidate program satisfies the constraints")
+        tops, holds, heating, cooling = tops[safe], holds[safe], heating[safe], cooling[safe]
+
+        n = len(tops)
+        velocities = np.column_stack([
+            np.full(n, min(np.trunc(60*(inledande_smaltpunkt - room_temp)/uppvarmning_time), 999)),
+            heating, cooling,
+            np.full(n, np.trunc(60*(n_astemp - o_astemp)/avspanning_time)),
+            np.full(n, -20)])
+        endTemps = np.column_stack([np.full(n, inledande_smaltpunkt), tops, np.full(n, o_astemp),
+                                    np.full(n, n_astemp), np.full(n, room_temp)])
+        holdingTimes = np.zeros((n, 5), dtype=np.int64)
+        holdingTimes[:, 1] = holds
+        candidates = firingCurveBatch(np.full(n, room_temp), velocities, endTemps, holdingTimes)
+        return candidates.curve(int(np.argmin(candidates.totalTimes)))
+
+    def _build_curve(self, glass_info, uppvarmning_time, halltider_time, avspanning_time, topptemp, minutes, room_temp):
         o_astemp = glass_info.get("o_astemp")
         n_astemp = glass_info.get("n_astemp")
         inledande_smaltpunkt = self.glass_data["Inledande_smaltpunkt"]
@@ -434,82 +1450,418 @@ class GlassTypeHandler:
         
         curve = firingCurve(room_temp)
         curve.newPhase(first_heating_velocity, inledande_smaltpunkt)
-        curve._healthy()
+        self._check(curve)
         curve.newPhase(second_heating_velocity, topptemp, minutes)
-        curve._healthy()
+        self._check(curve)
         curve.newPhase(first_cooling_velocity, o_astemp)
-        curve._healthy()
+        self._check(curve)
         curve.newPhase(second_cooling_velocity, n_astemp)
-        curve._healthy()
+        self._check(curve)
         curve.newPhase(last_cooling_velocity, room_temp)
-        curve._healthy()
+        self._check(curve)
+        if self.validation == "sampled" and random.random() < self.sample_rate:
+            curve._healthy()
         return curve
+
+    def _check(self, curve):
+        '''Checks a curve under construction according to the validation mode'''
+        if self.validation == "always":
+            curve._healthy()
+        elif self.validation == "sampled":
+            curve._quickHealthy()
     
-    def plotting_of_curve(self, curve):
-        total_time = 0
-        current_temp = curve._roomTemp
+    def glass_by_name(self, name):
+        '''The glass record with the given name, ValueError if there is none'''
+        try:
+            return self._glass_index[name]
+        except KeyError:
+            raise ValueError(f"Unknown glass '{name}'") from None
+
+    def _lookup_times(self, section, kategorier, radii, layers, ovens = None, interpolate = False, extrapolate = False):
+        '''Looks up table times for arrays of category, radius, layers and (optionally) oven type.
+        With interpolate set, radius and layers need not be table values.'''
+        times = np.empty(len(radii))
+        keys = np.char.add(np.char.add(kategorier, "|"), ovens) if ovens is not None else kategorier
+        uniqueKeys, inverse = np.unique(keys, return_inverse=True)
+        for k, key in enumerate(uniqueKeys):
+            kategori, _, oven = str(key).partition("|")
+            rows = inverse == k
+            table = self._table(section, kategori, oven or None)
+            if interpolate:
+                times[rows] = table.interpolate(radii[rows], layers[rows], extrapolate)
+            else:
+                times[rows] = table.lookup(radii[rows], layers[rows])
+        return times
+
+    def batch_curves(self, glass_names, oven_types, radii, layers, minutes, room_temps, firing_types,
+                     interpolate = False, extrapolate = False):
+        '''Non-interactive, vectorized firing_curve_creator.
+        All arguments are scalars or arrays that broadcast against each other; the result
+        is a firingCurveBatch with one five-phase program per broadcast element.
+        With interpolate set, any radius and layer count is allowed (see _TableGrid.interpolate).'''
+        glass_names, oven_types, radii, layers, minutes, room_temps, firing_types = (
+            np.ravel(a) for a in np.broadcast_arrays(np.asarray(glass_names, dtype=str), np.asarray(oven_types, dtype=str),
+                                                     radii, layers, minutes, room_temps, np.asarray(firing_types, dtype=str)))
+        for values, allowed, name in ((minutes, self.MINUTES, "Minutes"), (room_temps, self.ROOM_TEMPS, "Room temperature")):
+            outside = (values < allowed[0]) | (values > allowed[-1])
+            if np.any(outside):
+                raise ValueError(f"{name} must be {allowed[0]}-{allowed[-1]}, got {values[outside][0]}")
+        room_temps = room_temps.astype(np.int64)
+
+        names, glass_index = np.unique(glass_names, return_inverse=True)
+        glasses = [self.glass_by_name(str(name)) for name in names]
+        kategorier = np.array([glass["kategori"] for glass in glasses], dtype=str)[glass_index]
+        o_astemp = np.array([glass["o_astemp"] for glass in glasses])[glass_index]
+        n_astemp = np.array([glass["n_astemp"] for glass in glasses])[glass_index]
+
+        firing_index = np.searchsorted(np.array(["f", "s", "t"]), firing_types).clip(0, 2)
+        if np.any(np.array(["f", "s", "t"])[firing_index] != firing_types):
+            raise ValueError("Firing type must be 'f', 's' or 't'")
+        topptemps = np.array([[self._topptemp(glass, firing_type) for firing_type in "fst"]
+                              for glass in glasses])[glass_index, firing_index]
+
+        uppvarmning_time = self._lookup_times("Tider for uppvarmning", kategorier, radii, layers, oven_types, interpolate, extrapolate)
+        halltider_time = self._lookup_times("Halltider", kategorier, radii, layers, None, interpolate, extrapolate)
+        avspanning_time = self._lookup_times("Avspanningstider", kategorier, radii, layers, None, interpolate, extrapolate)
+
+        inledande_smaltpunkt = self.glass_data["Inledande_smaltpunkt"]
+        n = len(room_temps)
+        velocities = np.column_stack([
+            np.minimum(np.trunc(60*(inledande_smaltpunkt - room_temps)/uppvarmning_time), 999),
+            np.full(n, 999),
+            np.trunc(60*(o_astemp - topptemps)/halltider_time),
+            np.trunc(60*(n_astemp - o_astemp)/avspanning_time),
+            np.full(n, -20)])
+        endTemps = np.column_stack([np.full(n, inledande_smaltpunkt), topptemps, o_astemp, n_astemp, room_temps])
+        holdingTimes = np.zeros((n, 5), dtype=np.int64)
+        holdingTimes[:, 1] = minutes
+        return firingCurveBatch(room_temps, velocities, endTemps, holdingTimes)
+
+    def catalog_orders(self, minutes = range(1, 16), room_temps = (20,), firing_types = "fst"):
+        '''Yields every valid program as an order tuple in ORDER_FIELDS order: all glass sorts,
+        their allowed oven types and every radius and layer count in the tables'''
+        for glass in self.glass_data["Glassorter"]:
+            for oven_type in self.allowed_oven_types(glass):
+                table = self._table("Tider for uppvarmning", glass["kategori"], oven_type)
+                for radius, layers, firing_type, minute, room_temp in itertools.product(
+                        table.radii.tolist(), table.layers.tolist(), firing_types, minutes, room_temps):
+                    yield (glass["namn"], oven_type, radius, layers, minute, room_temp, firing_type)
+
+    def compare(self, glass_name, reference, candidates, intervalSeconds = 60):
+        '''compare_curves with the annealing temperatures of the glass'''
+        glass_info = self.glass_by_name(glass_name)
+        return compare_curves(reference, candidates, glass_info["o_astemp"], glass_info["n_astemp"], intervalSeconds)
 
-        plt.figure(figsize=(10, 6))
+    # The order fields each phase of a generated program depends on: the heatings on the room
+    # temperature, heating table and top temperature, the coolings on the glass' annealing
+    # temperatures, cooling tables and again the room temperature for the last one
+    PHASE_PARAMETERS = (
+        {"glass_name", "oven_type", "radius", "layers", "room_temp"},
+        {"glass_name", "firing_type", "minutes"},
+        {"glass_name", "firing_type", "radius", "layers"},
+        {"glass_name", "radius", "layers"},
+        {"glass_name", "room_temp"},
+    )
 
-        # Create a colormap
-        cmap = plt.get_cmap('tab20')  # A colormap with many distinct colors
+    def sweep(self, order, chunk_size = 65536, extrapolate = False, **values):
+        '''What-if sweep: streams phase times and total time for every combination of the values
+        given for some ORDER_FIELDS, e.g. room_temp=range(10, 31), glass_name=[...], with the
+        other fields held at their value in order.
 
-        times = [0]
-        temperatures = [current_temp]
+        Yields structured NumPy arrays of at most chunk_size rows, in itertools.product order,
+        with one field per swept parameter plus "times" (minutes per phase), "totalTime" and
+        "valid". Each phase is only computed once for every combination of the swept parameters
+        it depends on (PHASE_PARAMETERS), and the rows are assembled from those per chunk. A phase
+        that depends on more combinations than chunk_size is computed chunk by chunk instead, so
+        memory is bounded by chunk_size and does not grow with the number of rows. Combinations that make no valid program
+        have valid False and times -1.'''
+        unknown = set(values) - set(ORDER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+        if not values:
+            raise ValueError("Give at least one parameter to sweep")
+        fields = list(values)
+        grids = {field: np.asarray(list(values[field])) for field in fields}
+        shape = tuple(len(grids[field]) for field in fields)
+        if 0 in shape:
+            return
+        missing = [field for field in ORDER_FIELDS if field not in values and field not in order]
+        if missing:
+            raise ValueError(f"Missing fields: {', '.join(missing)}")
+
+        def phaseColumns(parameters, dependent, subIndex):
+            '''Columns of the order fields a phase depends on, for flat indices into its sub-grid'''
+            positions = np.unravel_index(subIndex, [len(grids[field]) for field in dependent]) if dependent else ()
+            swept = {field: grids[field][position] for field, position in zip(dependent, positions)}
+            return {field: swept[field] if field in swept else np.asarray([order[field]]) for field in parameters}
+
+        # A phase whose sub-grid fits in a chunk is computed once up front. Larger ones are
+        # computed per chunk for the combinations in it, so memory stays bounded by chunk_size.
+        phaseTimes = []
+        for phase, parameters in enumerate(self.PHASE_PARAMETERS):
+            dependent = [field for field in fields if field in parameters]
+            size = int(np.prod([len(grids[field]) for field in dependent]))
+            times = None
+            if size <= chunk_size:
+                times = self._sweep_times(phase, phaseColumns(parameters, dependent, np.arange(size)), extrapolate)
+            phaseTimes.append((parameters, dependent, times))
+
+        dtype = [(field, grids[field].dtype) for field in fields] + [
+            ("times", np.int64, (len(self.PHASE_PARAMETERS),)), ("totalTime", np.int64), ("valid", bool)]
+        rows = int(np.prod(shape))
+        for start in range(0, rows, chunk_size):
+            index = dict(zip(fields, np.unravel_index(np.arange(start, min(start + chunk_size, rows)), shape)))
+            chunk = np.empty(len(index[fields[0]]), dtype)
+            for field in fields:
+                chunk[field] = grids[field][index[field]]
+            for phase, (parameters, dependent, times) in enumerate(phaseTimes):
+                if not dependent:
+                    chunk["times"][:, phase] = times[0]
+                    continue
+                subIndex = np.ravel_multi_index([index[field] for field in dependent],
+                                                [len(grids[field]) for field in dependent])
+                if times is not None:
+                    chunk["times"][:, phase] = times[subIndex]
+                else:
+                    unique, inverse = np.unique(subIndex, return_inverse=True)
+                    chunk["times"][:, phase] = self._sweep_times(
+                        phase, phaseColumns(parameters, dependent, unique), extrapolate)[inverse]
+            chunk["valid"] = (chunk["times"] >= 0).all(axis=1)
+            chunk["totalTime"] = np.where(chunk["valid"], chunk["times"].sum(axis=1), -1)
+            yield chunk
+
+    def _sweep_times(self, phase, columns, extrapolate = False):
+        '''Times of one phase of the generated program (see batch_curves) for arrays of the order
+        fields it depends on, -1 for rows that make no valid program instead of raising.
+        Arrays of length 1 are only broadcast at the end, so fixed fields are looked up once.'''
+        names, glassIndex = np.unique(columns["glass_name"].astype(str), return_inverse=True)
+        glasses = [self._glass_index.get(str(name)) for name in names]
+        valid = np.array([glass is not None for glass in glasses])[glassIndex]
+        glasses = [glass or {} for glass in glasses]
+
+        def glassValues(key):
+            return np.array([glass.get(key, np.nan) for glass in glasses], dtype=float)[glassIndex]
+
+        def tableTimes(section, ovens = None):
+            '''Interpolated table times, NaN where there is no table or radius and layers are outside it'''
+            keys = np.array([glass.get("kategori", "") for glass in glasses], dtype=str)[glassIndex]
+            if ovens is not None:
+                keys = np.char.add(np.char.add(keys, "|"), ovens)
+            uniqueKeys, inverse = np.unique(keys, return_inverse=True)
+            inverse, radii, layers = np.broadcast_arrays(inverse, columns["radius"].astype(float),
+                                                         columns["layers"].astype(float))
+            times = np.full(inverse.shape, np.nan)
+            for k, key in enumerate(uniqueKeys):
+                kategori, _, oven = str(key).partition("|")
+                table = self._table_index[section].get((kategori, oven or None))
+                if table is None:
+                    continue
+                rows = inverse == k
+                r, l = radii[rows], layers[rows]
+                inside = extrapolate | ((r >= table.radii[0]) & (r <= table.radii[-1])
+                                        & (l >= table.layers[0]) & (l <= table.layers[-1]))
+                times[rows] = np.where(inside, table.interpolate(r, l, extrapolate=True), np.nan)
+            return times
+
+        def topptemps():
+            firingTypes = columns["firing_type"].astype(str)
+            firingIndex = np.searchsorted(np.array(["f", "s", "t"]), firingTypes).clip(0, 2)
+            known = np.array(["f", "s", "t"])[firingIndex] == firingTypes
+            table = np.array([[self._topptemp(glass, firing_type) if glass else np.nan for firing_type in "fst"]
+                              for glass in glasses], dtype=float)
+            return np.where(known, table[glassIndex, firingIndex], np.nan)
+
+        inledande_smaltpunkt = float(self.glass_data["Inledande_smaltpunkt"])
+        holdingTimes = 0.0
+        def roomTemps():
+            roomTemps = columns["room_temp"].astype(float)
+            return np.where((roomTemps >= self.ROOM_TEMPS[0]) & (roomTemps <= self.ROOM_TEMPS[-1]), roomTemps, np.nan)
 
+        if phase == 0:
+            startTemps = roomTemps()
+            endTemps = inledande_smaltpunkt
+            uppvarmning_time = tableTimes("Tider for uppvarmning", columns["oven_type"].astype(str))
+            velocities = np.minimum(np.trunc(60*(inledande_smaltpunkt - startTemps)/uppvarmning_time), 999)
+        elif phase == 1:
+            startTemps = inledande_smaltpunkt
+            endTemps = topptemps()
+            velocities = 999.0
+            holdingTimes = columns["minutes"].astype(float)
+            holdingTimes = np.where((holdingTimes >= self.MINUTES[0]) & (holdingTimes <= self.MINUTES[-1]), holdingTimes, np.nan)
+        elif phase == 2:
+            startTemps = topptemps()
+            endTemps = glassValues("o_astemp")
+            velocities = np.trunc(60*(endTemps - startTemps)/tableTimes("Halltider"))
+        elif phase == 3:
+            startTemps = glassValues("o_astemp")
+            endTemps = glassValues("n_astemp")
+            velocities = np.trunc(60*(endTemps - startTemps)/tableTimes("Avspanningstider"))
+        else:
+            startTemps = glassValues("n_astemp")
+            endTemps = roomTemps()
+            velocities = -20.0
+
+        valid, velocities, startTemps, endTemps, holdingTimes = np.broadcast_arrays(
+            valid, velocities, startTemps, endTemps, holdingTimes)
+        valid = valid & np.isfinite(velocities) & np.isfinite(startTemps) & np.isfinite(endTemps) & np.isfinite(holdingTimes)
+        times = _phaseTimes(*(np.where(valid, values, 0).astype(np.int64)
+                              for values in (velocities, startTemps, endTemps, holdingTimes)))
+        return np.where(valid, times, -1)
+
+    def plotting_of_curve(self, curve, show = True):
+        '''Plots the curve and returns the figure, only blocking in plt.show() if show is set.
+        Files and batches of images are faster with curve_renderer.CurveRenderer, which needs no pyplot.'''
+        import matplotlib.pyplot as plt
+        from curve_renderer import CurveRenderer
+
+        renderer = CurveRenderer(plt.figure(figsize=(10, 6)))
         for idx, phase in enumerate(curve):
             # Assign a color if it's not already set
             if phase._color is None:
-                phase._color = cmap(idx % 20)  # Get a color from the colormap
-
-            # Calculate time increment for the phase
-            phase_time = phase._time
-            middle_time = None
-            if phase._holdingTime != 0:
-                phase_holdingTime = phase._holdingTime
-                middle_time = total_time + phase_time - phase_holdingTime
-            start_time = total_time
-            end_time = total_time + phase_time
-            total_time = end_time
-
-            # Time points for this phase
-            if middle_time:
-                time_points = [start_time, middle_time, end_time]
-            else:
-                time_points = [start_time, end_time]
+                phase._color = tuple(renderer.palette[idx % len(renderer.palette)].tolist())
+        renderer.draw(curve)
+        if show:
+            plt.show()
+        return renderer.figure
 
-            # Temperature points for this phase
-            if phase._velocity == 0:
-                # Holding phase
-                temp_points = [current_temp, current_temp]
-            else:
-                if middle_time:
-                    temp_points = [current_temp, phase._endTemp, phase._endTemp]
-                else:
-                    temp_points = [current_temp, phase._endTemp]
+class Profiler:
+    '''Call counts, cumulative perf_counter_ns time and traversal steps of the hot paths.
+
+    Enabling it wraps the methods listed in PROFILED and disabling it puts the originals
+    back, so a disabled profiler costs nothing. Times include nested profiled calls, e.g.
+    _updateFrom inside newPhase. Counters are not locked, so with threads they are close
+    but not exact. FIRING_CURVE_PROFILE=1 enables it when the module is imported.'''
+    # (class, method, steps taken for the call's arguments or None), steps counted before the call
+    PROFILED = (
+        (_Phase, "_calculateTime", None),
+        # newPhase, removePhase and the changes walk the list through findPhase, which counts their steps
+        (firingCurve, "newPhase", None),
+        (firingCurve, "removePhase", None),
+        (firingCurve, "findPhase", lambda self, index: min(index, self._totalPhases - 1 - index) if 0 <= index < self._totalPhases else 0),
+        (firingCurve, "_updateFrom", lambda self, index, phase=None: self._totalPhases - index),
+        (firingCurve, "changePhaseEndTemp", None),
+        (firingCurve, "changePhaseVelocity", None),
+        (firingCurve, "changePhaseHoldingTime", None),
+        (firingCurve, "_quickHealthy", None),
+        (firingCurve, "_healthy", lambda self: 2 * self._totalPhases),
+        (compactFiringCurve, "_refreshPhase", None),
+        (compactFiringCurve, "newPhase", None),
+        (compactFiringCurve, "removePhase", None),
+        (compactFiringCurve, "findPhase", None),
+        (compactFiringCurve, "_uppdateIndexAndTime", lambda self, startPhase=None: self._totalPhases),
+        (compactFiringCurve, "_healthy", lambda self: self._totalPhases),
+        (firingCurveBatch, "sampleTraces", None),
+        (GlassTypeHandler, "_load_tables", None),
+        (GlassTypeHandler, "data_finder", None),
+        (GlassTypeHandler, "_table_times", None),
+        (GlassTypeHandler, "_topptemp", None),
+        (GlassTypeHandler, "_lookup_times", None),
+        (GlassTypeHandler, "curve_from_parameters", None),
+        (GlassTypeHandler, "_build_curve", None),
+        (GlassTypeHandler, "_check", None),
+        (GlassTypeHandler, "batch_curves", None),
+        (GlassTypeHandler, "shortest_curve", None),
+        (GlassTypeHandler, "_sweep_times", None),
+    )
 
-            # Plot this phase
-            plt.plot(time_points, temp_points, marker='o', color=phase._color, label=f'Fas {idx+1}')
+    def __init__(self):
+        self.enabled = False
+        self._originals = {}
+        self._counters = {f"{cls.__name__}.{name}": [0, 0, 0] for cls, name, _ in self.PROFILED}
 
-            # Update current temperature
-            current_temp = phase._endTemp
+    def _wrap(self, original, counter, steps):
+        perf_counter_ns = time.perf_counter_ns
 
-            # Append to lists for potential use later
-            times.append(end_time)
-            temperatures.append(current_temp)
+        @functools.wraps(original)
+        def profiled(*args, **kwargs):
+            if steps is not None:
+                counter[2] += steps(*args, **kwargs)
+            start = perf_counter_ns()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                counter[1] += perf_counter_ns() - start
+                counter[0] += 1
+        return profiled
+
+    def enable(self):
+        if self.enabled:
+            return
+        for cls, name, steps in self.PROFILED:
+            original = cls.__dict__[name]
+            self._originals[cls, name] = original
+            setattr(cls, name, self._wrap(original, self._counters[f"{cls.__name__}.{name}"], steps))
+        self.enabled = True
+
+    def disable(self):
+        for (cls, name), original in self._originals.items():
+            setattr(cls, name, original)
+        self._originals.clear()
+        self.enabled = False
+
+    def reset(self):
+        for counter in self._counters.values():
+            counter[:] = [0, 0, 0]
+
+    @contextlib.contextmanager
+    def profiling(self):
+        '''Profiles the block, leaving the profiler as it was afterwards'''
+        enabled = self.enabled
+        self.enable()
+        try:
+            yield self
+        finally:
+            if not enabled:
+                self.disable()
+
+    def stats(self):
+        '''Calls, total and mean time and traversal steps of every profiled method that was called'''
+        return {name: {"calls": calls, "total_ns": total, "mean_ns": total // calls, "steps": steps}
+                for name, (calls, total, steps) in self._counters.items() if calls}
+
+    def report(self, file = None):
+        '''Prints the stats as a table, slowest in total first'''
+        file = file or sys.stderr
+        print(f"{'method':<40}{'calls':>10}{'total ms':>12}{'mean us':>12}{'steps':>12}", file=file)
+        for name, stat in sorted(self.stats().items(), key=lambda item: -item[1]["total_ns"]):
+            print(f"{name:<40}{stat['calls']:>10}{stat['total_ns'] / 1e6:>12.3f}{stat['mean_ns'] / 1e3:>12.3f}"
+                  f"{stat['steps']:>12}", file=file)
+
+    def export(self, sink):
+        '''Hands the stats to sink, a callable taking the stats dict, such as statsd_sink()'''
+        sink(self.stats())
+
+
+def statsd_sink(host = "127.0.0.1", port = 8125, prefix = "firing_curve"):
+    '''Sink for Profiler.export that sends the stats as statsd gauges over UDP'''
+    import socket
+    address = (host, port)
+
+    def send(stats):
+        lines = []
+        for name, stat in stats.items():
+            for key in ("calls", "total_ns", "mean_ns", "steps"):
+                lines.append(f"{prefix}.{name}.{key}:{stat[key]}|g")
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            # Packets kept well under the usual MTU
+            for start in range(0, len(lines), 10):
+                sock.sendto("\n".join(lines[start:start + 10]).encode(), address)
+    return send
+
+
+profiler = Profiler()
+if os.environ.get("FIRING_CURVE_PROFILE", "0") not in ("0", ""):
+    profiler.enable()
 
-        plt.title('Brännkurva')
-        plt.xlabel('Tid (minuter)')
-        plt.ylabel('Temperatur (°C)')
-        plt.grid(True)
-        plt.legend(title='Faser', bbox_to_anchor=(1.05, 1), loc='upper left')  # Place legend outside the plot
-        plt.tight_layout()
-        plt.show()
 
 def main():
     '''Test code of methods above'''
     json_filepath = 'tables.json'  # Path to your JSON file
-    handler = GlassTypeHandler(json_filepath)
+    try:
+        handler = GlassTypeHandler(json_filepath)
+    except FileNotFoundError as error:
+        print(error)
+        exit(1)
     fc = handler.firing_curve_creator()
     
     # Plot the firing curve
@@ -520,6 +1872,7 @@ def main():
 
         # Ensure the phase has a valid color and convert to hex
         if phase._color is not None:
+            import matplotlib.colors as mcolors
             color_hex = mcolors.to_hex(phase._color)
         else:
             color_hex = 'No color assigned'
@@ -532,6 +1885,189 @@ def main():
 
     
     
+ORDER_FIELDS = ("glass_name", "oven_type", "radius", "layers", "minutes", "room_temp", "firing_type")
+
+
+def _order_from_row(row):
+    '''Order parameters from a JSON object or CSV row, converting CSV strings to numbers'''
+    if not isinstance(row, dict):
+        raise ValueError("Row is not an object")
+    missing = [field for field in ORDER_FIELDS if field not in row]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    order = {"glass_name": str(row["glass_name"]), "oven_type": str(row["oven_type"]),
+             "radius": float(row["radius"]), "layers": float(row["layers"]),
+             "minutes": int(row["minutes"]), "room_temp": int(row["room_temp"]),
+             "firing_type": str(row["firing_type"])}
+    GlassTypeHandler._check_limits(order["minutes"], order["room_temp"])
+    return order
+
+
+def _json_rows(lines):
+    '''JSON objects from JSON lines, skipping blank lines. A line that is not valid JSON
+    is passed on as its JSONDecodeError, which generate_records turns into an "error" record.'''
+    for line in lines:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                yield error
+
+
+def _batch_records(handler, orders, extrapolate = False):
+    '''JSON-ready records for a list of orders, computed as one batch'''
+    batch = handler.batch_curves(*([order[field] for order in orders] for field in ORDER_FIELDS),
+                                 interpolate=True, extrapolate=extrapolate)
+    records = []
+    for i, order in enumerate(orders):
+        phases = [{"startTemp": s, "endTemp": e, "velocity": v, "holdingTime": h, "time": t}
+                  for s, e, v, h, t in zip(batch.startTemps[i].tolist(), batch.endTemps[i].tolist(),
+                                           batch.velocities[i].tolist(), batch.holdingTimes[i].tolist(),
+                                           batch.times[i].tolist())]
+        records.append({**order, "phases": phases, "totalTime": int(batch.totalTimes[i])})
+    return records
+
+
+_END = object()  # Marks the end of the rows in generate_records; any row, None too, is input
+
+
+def generate_records(handler, rows, chunk_size = 1024, extrapolate = False):
+    '''Yields one curve record per input row, working through the rows in batches.
+    A row that cannot be turned into a curve yields the row with an "error" message instead.'''
+    chunk = []
+    for row in itertools.chain(rows, [_END]):
+        if row is not _END:
+            chunk.append(row)
+            if len(chunk) < chunk_size:
+                continue
+        orders, records = [], {}
+        for i, row in enumerate(chunk):
+            if isinstance(row, json.JSONDecodeError):
+                records[i] = {"row": row.doc.strip(), "error": f"Invalid JSON: {row}"}
+                continue
+            try:
+                orders.append((i, _order_from_row(row)))
+            except (ValueError, TypeError) as error:
+                records[i] = {**(row if isinstance(row, dict) else {"row": row}), "error": str(error)}
+        try:
+            if orders:
+                records.update(zip((i for i, _ in orders), _batch_records(handler, [order for _, order in orders],
+                                                                          extrapolate)))
+        except ValueError:
+            # Some order in the chunk is invalid, redo them one by one to find it
+            for i, order in orders:
+                try:
+                    records[i] = _batch_records(handler, [order], extrapolate)[0]
+                except ValueError as error:
+                    records[i] = {**order, "error": str(error)}
+        for i in range(len(chunk)):
+            yield records[i]
+        chunk = []
+
+
+# Handler of a catalog worker process, loaded once by _init_catalog_worker
+_catalogHandler = None
+
+
+def _init_catalog_worker(json_filepath):
+    global _catalogHandler
+    _catalogHandler = GlassTypeHandler(json_filepath)
+
+
+def _catalog_chunk(orders, binary = False):
+    '''Computes a chunk of order tuples in a worker and returns it ready to write:
+    as JSON lines, or as the batch itself for a binary curve file'''
+    orders = [dict(zip(ORDER_FIELDS, order)) for order in orders]
+    if binary:
+        batch = _catalogHandler.batch_curves(*([order[field] for order in orders] for field in ORDER_FIELDS),
+                                             interpolate=True)
+        return len(batch), batch
+    records = _batch_records(_catalogHandler, orders)
+    return len(records), "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+
+def build_catalog(json_filepath, out_path, orders, workers = None, chunk_size = 2000, binary = False):
+    '''Computes the orders in a process pool and writes them to out_path in order, as JSON lines or,
+    if binary, as a curve file for CurveFile where curve i belongs to order i.
+    Only a few chunks per worker are in flight at once, so memory use does not grow with the catalog.
+    Returns the number of curves, the time taken and the throughput.'''
+    workers = workers or os.cpu_count() or 1
+    orders = iter(orders)
+    chunks = iter(lambda: list(itertools.islice(orders, chunk_size)), [])
+    start = time.perf_counter()
+    curves = 0
+    out = CurveFileWriter(out_path) if binary else open(out_path, "w", encoding="utf-8")
+    write = out.add_batch if binary else out.write
+    with out:
+        if workers == 1:
+            _init_catalog_worker(json_filepath)
+            for chunk in chunks:
+                count, result = _catalog_chunk(chunk, binary)
+                write(result)
+                curves += count
+        else:
+            with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_catalog_worker,
+                                                        initargs=(json_filepath,)) as executor:
+                pending = collections.deque()
+                for chunk in itertools.chain(chunks, [None]):
+                    if chunk is not None:
+                        pending.append(executor.submit(_catalog_chunk, chunk, binary))
+                    while pending and (chunk is None or len(pending) >= 2*workers):
+                        count, result = pending.popleft().result()
+                        write(result)
+                        curves += count
+    seconds = time.perf_counter() - start
+    return {"curves": curves, "seconds": round(seconds, 3), "curves_per_s": round(curves / seconds, 1), "workers": workers}
+
+
+def cli(argv = None):
+    '''Headless entry point: one order from the arguments, or many from JSON lines/CSV on stdin.
+    Curves are written to stdout as JSON lines.'''
+    parser = argparse.ArgumentParser(description="Generate firing curves without prompts and print them as JSON lines.")
+    parser.add_argument("--tables", default="tables.json", help="table file, relative to this script")
+    parser.add_argument("--stdin", choices=["jsonl", "csv"], help="read orders from stdin instead of the arguments")
+    parser.add_argument("--extrapolate", action="store_true", help="clamp radius and layers outside the tables")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="orders computed per batch")
+    parser.add_argument("--catalog", metavar="PATH", help="write every valid program to PATH as JSON lines")
+    parser.add_argument("--catalog-format", choices=["jsonl", "binary"], default="jsonl",
+                        help="binary writes a curve file that CurveFile opens with mmap")
+    parser.add_argument("--workers", type=int, help="processes used for --catalog, defaults to all cores")
+    parser.add_argument("--profile", action="store_true", help="print where the time went to stderr at the end")
+    for field in ORDER_FIELDS:
+        parser.add_argument("--" + field.replace("_", "-"))
+    args = parser.parse_args(argv)
+    if args.profile:
+        with profiler.profiling():
+            try:
+                return _cli(args)
+            finally:
+                profiler.report()
+    return _cli(args)
+
+
+def _cli(args):
+    handler = GlassTypeHandler(args.tables)
+    if args.catalog:
+        orders = handler.catalog_orders(room_temps=(int(args.room_temp or 20),))
+        stats = build_catalog(args.tables, args.catalog, orders, args.workers, args.chunk_size,
+                              args.catalog_format == "binary")
+        print(json.dumps(stats), file=sys.stderr)
+        return 0
+    if args.stdin == "jsonl":
+        rows = _json_rows(sys.stdin)
+    elif args.stdin == "csv":
+        rows = csv.DictReader(sys.stdin)
+    else:
+        rows = [{field: getattr(args, field) for field in ORDER_FIELDS if getattr(args, field) is not None}]
+
+    failed = False
+    for record in generate_records(handler, rows, args.chunk_size, args.extrapolate):
+        failed = failed or "error" in record
+        sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return 1 if failed else 0
+
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(cli())
     main()
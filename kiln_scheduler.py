@@ -0,0 +1,150 @@
+import argparse
+import heapq
+import json
+import sys
+import time
+
+import numpy as np
+
+from firing_curve import GlassTypeHandler, ORDER_FIELDS, _order_from_row
+
+
+class KilnScheduler:
+    '''Assigns firing orders to a fleet of kilns and start times, aiming for the shortest makespan.
+
+    kilns is a list of {"name": ..., "oven_type": "t" or "s"}. Orders are dicts with the
+    ORDER_FIELDS of firing_curve.py and optionally an "order_id". An order without an
+    oven_type may go in any kiln type its glass category allows.'''
+    def __init__(self, handler, kilns):
+        self.handler = handler
+        self.kilns = list(kilns)
+        if not self.kilns:
+            raise ValueError("At least one kiln is needed")
+        for kiln in self.kilns:
+            if kiln["oven_type"] not in ("t", "s"):
+                raise ValueError(f"Unknown oven type '{kiln['oven_type']}' for kiln '{kiln['name']}'")
+
+    def _firings(self, orders, pieces_per_firing):
+        '''Groups orders that can share a program: same glass, firing type, room temperature and oven type wish.
+        Within a group the biggest pieces go together, and a firing runs the program for its
+        largest radius, layer count and hold time, which is also its longest.'''
+        groups = {}
+        for order in orders:
+            key = (order["glass_name"], order["firing_type"], order["room_temp"], order["oven_type"])
+            groups.setdefault(key, []).append(order)
+        firings = []
+        for group in groups.values():
+            group.sort(key=lambda order: (order["radius"], order["layers"], order["minutes"]), reverse=True)
+            for start in range(0, len(group), pieces_per_firing):
+                pieces = group[start:start + pieces_per_firing]
+                firings.append({**pieces[0],
+                                "radius": max(order["radius"] for order in pieces),
+                                "layers": max(order["layers"] for order in pieces),
+                                "minutes": max(order["minutes"] for order in pieces),
+                                "orders": [order["order_id"] for order in pieces]})
+        return firings
+
+    def _problems(self, order, oven_types):
+        '''Why the order cannot be made in any of the oven types, or "" if it can be made in one'''
+        problems = []
+        for oven_type in oven_types if order["oven_type"] == "" else [order["oven_type"]]:
+            try:
+                self.handler.check_order(*(oven_type if field == "oven_type" else order[field] for field in ORDER_FIELDS))
+                return ""
+            except ValueError as error:
+                problems.append(str(error))
+        return "; ".join(dict.fromkeys(problems)) or f"No kiln for oven type '{order['oven_type']}'"
+
+    def _durations(self, firings, oven_type, reasons):
+        '''Program length in minutes of every firing in an oven type, inf where it cannot be made in it.
+        Why a firing cannot be made is noted in reasons, so one bad order does not stop the batch.'''
+        durations = np.full(len(firings), np.inf)
+        allowed = []
+        for i, firing in enumerate(firings):
+            if firing["oven_type"] not in ("", oven_type):
+                continue
+            try:
+                self.handler.check_order(*(oven_type if field == "oven_type" else firing[field] for field in ORDER_FIELDS))
+            except ValueError as error:
+                reasons.setdefault(i, []).append(str(error))
+                continue
+            allowed.append(i)
+        if allowed:
+            columns = [[firings[i][field] for i in allowed] for field in ORDER_FIELDS if field != "oven_type"]
+            batch = self.handler.batch_curves(columns[0], oven_type, *columns[1:], interpolate=True)
+            durations[allowed] = batch.totalTimes
+        return durations
+
+    def schedule(self, orders, pieces_per_firing = 1):
+        '''Returns the firings with kiln, start and end minute, the makespan and the solve time.
+        Orders that cannot be fired are listed under "unscheduled" with the reason.
+
+        Firings are placed longest first, each on the compatible kiln where it would finish
+        earliest (LPT list scheduling). Free kilns are kept in one heap per oven type, so
+        placing a firing costs O(log kilns).'''
+        start_time = time.perf_counter()
+        oven_types = sorted({kiln["oven_type"] for kiln in self.kilns})
+        valid, unscheduled = [], []
+        for i, order in enumerate(orders):
+            order_id = order.get("order_id", i)
+            try:
+                order = {**_order_from_row({**order, "oven_type": order.get("oven_type", "")}), "order_id": order_id}
+            except (ValueError, TypeError) as error:
+                unscheduled.append({"order_id": order_id, "reason": str(error)})
+                continue
+            # Checked before grouping, so a bad order cannot make the firing it would share fail
+            problems = self._problems(order, oven_types)
+            if problems:
+                unscheduled.append({"order_id": order_id, "reason": problems})
+            else:
+                valid.append(order)
+        firings = self._firings(valid, max(1, int(pieces_per_firing)))
+        reasons = {}
+        durations = {oven_type: self._durations(firings, oven_type, reasons) for oven_type in oven_types}
+        shortest = np.min(np.vstack([durations[oven_type] for oven_type in oven_types]), axis=0)
+
+        free = {oven_type: [(0, i) for i, kiln in enumerate(self.kilns) if kiln["oven_type"] == oven_type]
+                for oven_type in oven_types}
+        for heap in free.values():
+            heapq.heapify(heap)
+
+        schedule = []
+        for i in np.argsort(-shortest, kind="stable"):
+            if not np.isfinite(shortest[i]):
+                reason = "; ".join(dict.fromkeys(reasons.get(i, [f"No kiln for oven type '{firings[i]['oven_type']}'"])))
+                unscheduled.extend({"order_id": order_id, "reason": reason} for order_id in firings[i]["orders"])
+                continue
+            # The earliest finish among the first free kiln of each compatible oven type
+            finish, oven_type = min((free[oven_type][0][0] + durations[oven_type][i], oven_type)
+                                    for oven_type in oven_types if np.isfinite(durations[oven_type][i]))
+            available, kiln = heapq.heapreplace(free[oven_type], (finish, free[oven_type][0][1]))
+            schedule.append({**{field: firings[i][field] for field in ORDER_FIELDS}, "oven_type": oven_type,
+                             "kiln": self.kilns[kiln]["name"], "start": int(available), "end": int(finish),
+                             "orders": firings[i]["orders"]})
+
+        makespan = max((firing["end"] for firing in schedule), default=0)
+        return {"firings": schedule, "makespan": makespan,
+                "unscheduled": unscheduled,
+                "solve_seconds": round(time.perf_counter() - start_time, 4)}
+
+
+def main(argv = None):
+    '''Schedules JSON-lines orders from stdin on the kilns in a JSON file and prints the schedule as JSON'''
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("kilns", help='JSON file with a list of {"name": ..., "oven_type": "t" or "s"}')
+    parser.add_argument("--tables", default="tables.json")
+    parser.add_argument("--pieces-per-firing", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    with open(args.kilns, encoding="utf-8") as file:
+        kilns = json.load(file)
+    orders = [json.loads(line) for line in sys.stdin if line.strip()]
+    result = KilnScheduler(GlassTypeHandler(args.tables), kilns).schedule(orders, args.pieces_per_firing)
+    json.dump(result, sys.stdout, ensure_ascii=False)
+    sys.stdout.write("\n")
+    print(f"{len(orders)} orders, makespan {result['makespan']} min, solved in {result['solve_seconds']} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+'''Tests of the SQLite curve cache. Run from the repository root:
+
+    python -m pytest tests
+'''
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from curve_cache import CurveCache  # noqa: E402
+from firing_curve import GlassTypeHandler  # noqa: E402
+
+
+@pytest.fixture
+def tables(tmp_path):
+    path = tmp_path / "tables.json"
+    shutil.copy(os.path.join(REPO_DIR, "tables.json"), path)
+    return path
+
+
+@pytest.fixture
+def orders():
+    return list(GlassTypeHandler("tables.json").catalog_orders())[:12]
+
+
+def stored_orders(cache, orders):
+    '''The orders that have an entry in the cache file'''
+    keys = {cache._disk_key((name, oven, float(radius), float(layers), int(minutes), int(room), firing)): order
+            for order in orders for name, oven, radius, layers, minutes, room, firing in [order]}
+    return {keys[key] for (key,) in cache._db.execute("SELECT key FROM curves") if key in keys}
+
+
+def test_memory_hits_keep_entries_in_the_file(tables, orders, tmp_path):
+    cache = CurveCache(GlassTypeHandler(str(tables)), str(tmp_path / "curves.sqlite"), max_entries=5, memory_entries=3)
+    hot = orders[0]
+    for order in orders[1:]:
+        cache.phases(*hot)
+        cache.phases(*order)
+    assert cache.memory_hits == len(orders) - 2
+    assert cache.stats()["entries"] == 5
+    # The hot order is only ever served from memory, but it is the most recently used
+    assert stored_orders(cache, orders) == {hot, *orders[-4:]}
+    cache.close()
+
+
+def test_editing_the_tables_invalidates_the_entries(tables, orders, tmp_path):
+    cache = CurveCache(GlassTypeHandler(str(tables)), str(tmp_path / "curves.sqlite"), check_interval=0)
+    expected = [cache.curve(*order).to_bytes() for order in orders[:3]]
+    cache.phases(*orders[0])
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    with open(tables, "a") as file:
+        file.write("\n")
+    os.utime(tables, ns=(0, 0))
+    assert [cache.curve(*order).to_bytes() for order in orders[:3]] == expected
+    assert (cache.hits, cache.misses) == (1, 6)
+    assert cache.stats()["entries"] == 3
+    cache.close()
+
+    # The file keeps the entries of the current tables across restarts
+    cache = CurveCache(GlassTypeHandler(str(tables)), str(tmp_path / "curves.sqlite"))
+    cache.phases(*orders[0])
+    assert (cache.hits, cache.misses) == (1, 0)
+    cache.close()
@@ -0,0 +1,158 @@
+'''Tests of the two curve storages, the binary format and batch generation. Run from the repository root:
+
+    python -m pytest tests
+'''
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from firing_curve import (ORDER_FIELDS, CurveFile, CurveFileWriter, GlassTypeHandler,  # noqa: E402
+                          _json_rows, compactFiringCurve, firingCurve, generate_records, write_curve_file)
+
+
+@pytest.fixture(scope="module")
+def handler():
+    return GlassTypeHandler("tables.json", validation="always")
+
+
+def random_edits(rng, phases):
+    '''One random edit as (method name, arguments) for a curve of the given number of phases'''
+    choice = rng.random()
+    if phases == 0 or choice < 0.4:
+        return "newPhase", (rng.choice([-450, -45, -20, 0, 300, 999]), rng.randrange(0, 900, 10),
+                            rng.choice([0, 0, 10]), rng.randint(0, phases))
+    if choice < 0.6:
+        return "removePhase", (rng.randrange(phases),)
+    name = rng.choice(["changePhaseEndTemp", "changePhaseVelocity", "changePhaseHoldingTime"])
+    value = rng.randrange(0, 60) if name == "changePhaseHoldingTime" else rng.choice([-45, 300, 500, 999])
+    return name, (rng.randrange(phases), value)
+
+
+def assert_same_curve(linked, compact):
+    linked._healthy()
+    linked._quickHealthy()
+    compact._healthy()
+    compact._quickHealthy()
+    assert linked._totalPhases == compact._totalPhases
+    assert linked._totalTime == compact._totalTime == sum(phase._time for phase in linked)
+    assert [phase._startTemp for phase in linked] == [phase._startTemp for phase in compact]
+    assert [phase._index for phase in linked] == list(range(linked._totalPhases))
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_compact_curve_matches_linked_list_under_random_edits(seed):
+    rng = random.Random(seed)
+    linked, compact = firingCurve(20), compactFiringCurve(20, capacity=2)
+    phases = 0
+    for _ in range(100):
+        # Some steps are several edits in one transaction, committed together
+        edits = []
+        for _ in range(rng.randint(2, 6) if rng.random() < 0.2 else 1):
+            name, args = random_edits(rng, phases)
+            phases += {"newPhase": 1, "removePhase": -1}.get(name, 0)
+            edits.append((name, args))
+        for curve in (linked, compact):
+            with curve.transaction():
+                for name, args in edits:
+                    getattr(curve, name)(*args)
+        assert_same_curve(linked, compact)
+
+
+def test_edits_outside_index_raise():
+    for curve in (firingCurve(20), compactFiringCurve(20)):
+        with pytest.raises(IndexError):
+            curve.newPhase(100, 500, 0, 1)
+        curve.newPhase(100, 500)
+        with pytest.raises(IndexError):
+            curve.removePhase(1)
+
+
+def sample_curves(handler, count = 20):
+    orders = list(handler.catalog_orders())
+    rng = random.Random(0)
+    return [handler.curve_from_parameters(*orders[rng.randrange(len(orders))]) for _ in range(count)]
+
+
+def curve_rows(curve):
+    return [(p._velocity, p._startTemp, p._endTemp, p._holdingTime, p._time) for p in curve]
+
+
+def test_bytes_round_trip(handler):
+    for curve in sample_curves(handler):
+        data = curve.to_bytes()
+        for curveClass in (firingCurve, compactFiringCurve):
+            copy = curveClass.from_bytes(data)
+            assert copy._roomTemp == curve._roomTemp
+            assert copy._totalTime == curve._totalTime
+            assert curve_rows(copy) == curve_rows(curve)
+            assert copy.to_bytes() == data
+    with pytest.raises(ValueError):
+        firingCurve.from_bytes(b"not a curve")
+
+
+def test_curve_file_round_trip(handler, tmp_path):
+    curves = sample_curves(handler)
+    orders = list(handler.catalog_orders())[:50]
+    batch = handler.batch_curves(*zip(*orders))
+    path = tmp_path / "curves.bin"
+    assert write_curve_file(path, curves[:10] + [batch] + curves[10:]) == len(curves) + len(batch)
+
+    expected = curves[:10] + list(batch.curves()) + curves[10:]
+    with CurveFile(path) as curveFile:
+        assert len(curveFile) == len(expected)
+        for i, curve in enumerate(expected):
+            assert curveFile.total_time(i) == curve._totalTime
+            assert curveFile.to_bytes(i) == curve.to_bytes()
+            assert curve_rows(curveFile.curve(i)) == curve_rows(curve)
+            assert curve_rows(curveFile.curve(i, compactFiringCurve)) == curve_rows(curve)
+
+    with CurveFileWriter(tmp_path / "empty.bin") as writer:
+        pass
+    assert writer.curves == 0
+    with CurveFile(tmp_path / "empty.bin") as curveFile:
+        assert len(curveFile) == 0
+
+
+def test_batch_curves_equals_curve_from_parameters(handler):
+    orders = list(handler.catalog_orders(room_temps=(10, 25)))
+    rng = random.Random(1)
+    orders = [orders[rng.randrange(len(orders))] for _ in range(300)]
+    # Radii and layer counts between the table values are interpolated
+    orders += [(name, oven, radius + 2.5, layers + 0.5, minutes, room, firing)
+               for name, oven, radius, layers, minutes, room, firing in orders[:50]
+               if radius < 60 and layers < 5]
+    batch = handler.batch_curves(*zip(*orders), interpolate=True)
+    assert len(batch) == len(orders)
+    for i, order in enumerate(orders):
+        curve = handler.curve_from_parameters(*order)
+        assert int(batch.totalTimes[i]) == curve._totalTime, dict(zip(ORDER_FIELDS, order))
+        assert curve_rows(batch.curve(i)) == curve_rows(curve)
+        assert np.array_equal(batch.times[i], [phase._time for phase in curve])
+
+
+def test_batch_curves_rejects_what_curve_from_parameters_rejects(handler):
+    good = ("Bullseye 90", "t", 10, 2, 10, 20, "f")
+    for field, value in (("glass_name", "Okänt glas"), ("radius", 80), ("minutes", 99), ("room_temp", -400),
+                         ("firing_type", "x")):
+        order = list(good)
+        order[ORDER_FIELDS.index(field)] = value
+        with pytest.raises(ValueError):
+            handler.curve_from_parameters(*order)
+        with pytest.raises(ValueError):
+            handler.batch_curves(*order, interpolate=True)
+
+
+def test_generate_records_yields_one_record_per_row(handler):
+    lines = ['{"glass_name": "Bullseye 90", "oven_type": "t", "radius": 10, "layers": 2, "minutes": 10, '
+             '"room_temp": 20, "firing_type": "f"}', "[1, 2]", '"str"', "not json", "null", "{}"]
+    for chunk_size in (1, 2, 1024):
+        records = list(generate_records(handler, _json_rows(lines), chunk_size=chunk_size))
+        assert len(records) == len(lines)
+        assert records[0]["totalTime"] == handler.curve_from_parameters("Bullseye 90", "t", 10, 2, 10, 20, "f")._totalTime
+        assert [record.get("row") for record in records[1:5]] == [[1, 2], "str", "not json", None]
+        assert all("error" in record for record in records[1:])